@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useMemo, useState } from 'react';
 import {
   Box,
   Typography,
@@ -22,6 +22,12 @@ const DeploymentOptions = ({ config, onConfigChange, selectedOS, selectedMachine
   const [generatedConfig, setGeneratedConfig] = useState(null);
   const [useGenerated, setUseGenerated] = useState(true);
   const [userCredentials, setUserCredentials] = useState(null);
+
+  // Enhancement descriptions only change when a new config is generated, not on every render
+  const enhancementDescriptions = useMemo(
+    () => (generatedConfig?.tags?.length > 0 ? getEnhancementDescription(generatedConfig.tags) : []),
+    [generatedConfig]
+  );
   
   // Fetch user credentials on component mount
   useEffect(() => {
@@ -225,7 +231,7 @@ const DeploymentOptions = ({ config, onConfigChange, selectedOS, selectedMachine
                         ))}
                       </Box>
                       <Box sx={{ mb: 2 }}>
-                        {getEnhancementDescription(generatedConfig.tags).map((desc, index) => (
+                        {enhancementDescriptions.map((desc, index) => (
                           <Typography key={index} variant="body2" color="text.secondary">
                             • {desc}
                           </Typography>
@@ -1,73 +1,367 @@
 // Cloud-init configuration generator based on machine tags and requirements
 
+// Log files the deployment commands append to
+const USERDATA_LOG = '/var/log/cloud-init-userdata.log';
+const DEPLOYMENT_LOG = '/var/log/maas-deployment.log';
+// Shared suffix of the per-machine log lines, so each line only adds its own text
+const TEE_BOTH_LOGS = `| tee -a ${USERDATA_LOG} ${DEPLOYMENT_LOG}`;
+
+// Base packages installed on every machine
+const ROCKY_BASE_PACKAGES = [
+  'curl',
+  'wget',
+  'git',
+  'htop',
+  'vim',
+  'net-tools',
+  'openssh-server',
+  'sudo', // Ensure sudo is installed on Rocky
+  'tar',
+  'gzip',
+  // Additional system tools
+  'lldpd',
+  'nvme-cli',
+  'strace',
+  'ltrace',
+  'crash',
+  'kexec-tools', // Rocky equivalent of kdump-tools
+  'ibverbs-utils',
+  'infiniband-diags',
+  'screen',
+  'tmux',
+  'ipmitool',
+  'rdma-core',
+  'wireshark-cli', // Rocky equivalent of tshark
+  'fio',
+  'smartmontools',
+  'atop'
+];
+
+const UBUNTU_BASE_PACKAGES = [
+  'curl',
+  'wget',
+  'git',
+  'htop',
+  'vim',
+  'net-tools',
+  'openssh-server',
+  // Additional system tools
+  'lldpd',
+  'nvme-cli',
+  'strace',
+  'ltrace',
+  'crash',
+  'kdump-tools',
+  'ibverbs-utils',
+  'ibutils',
+  'infiniband-diags',
+  'screen',
+  'tmux',
+  'ipmitool',
+  'rdma-core',
+  'tshark',
+  'termshark',
+  'fio',
+  'smartmontools',
+  'iozone3',
+  'atop'
+];
+
+// Kernel and ARP settings written to /etc/sysctl.d/99-weka.conf
+const WEKA_SYSCTL_CONF = `# installed from platform cloud-init
+kernel.numa_balancing=0
+kernel.softlockup_all_cpu_backtrace=1
+kernel.panic = 300
+net.ipv4.conf.all.arp_announce = 2
+net.ipv4.conf.all.arp_filter = 1
+net.ipv4.conf.all.arp_ignore = 1
+net.ipv4.conf.default.arp_announce = 2
+net.ipv4.conf.default.arp_filter = 1
+net.ipv4.conf.default.arp_ignore = 1
+net.ipv4.conf.all.ignore_routes_with_linkdown = 1
+net.ipv4.conf.default.ignore_routes_with_linkdown = 1
+`;
+
+// Scripts that make sure the configured user exists and can log in
+// Each is a single runcmd entry, so the if/fi blocks stay within one entry and the
+// list cloud-init gets is much shorter
+const rockyUserScript = (username, password) => [
+  `# CRITICAL: Force ${username} user creation immediately (Rocky Linux compatibility)`,
+  'echo "=== EMERGENCY USER CREATION ===" | tee -a /var/log/cloud-init-userdata.log',
+  `if ! id ${username} >/dev/null 2>&1; then`,
+  `  echo "Cloud-init user creation appears to have failed. Creating ${username} user manually NOW..." | tee -a /var/log/cloud-init-userdata.log`,
+  `  useradd -m -s /bin/bash ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: useradd failed" | tee -a /var/log/cloud-init-userdata.log`,
+  `  echo "${username}:${password}" | chpasswd 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: chpasswd failed" | tee -a /var/log/cloud-init-userdata.log`,
+  `  usermod -aG wheel ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: usermod wheel failed" | tee -a /var/log/cloud-init-userdata.log`,
+  `  id ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log`,
+  '  echo "Emergency user creation completed" | tee -a /var/log/cloud-init-userdata.log',
+  'else',
+  `  echo "GOOD: ${username} user exists, skipping emergency creation" | tee -a /var/log/cloud-init-userdata.log`,
+  'fi',
+  'systemctl enable sshd 2>&1 | tee -a /var/log/cloud-init-userdata.log',
+  'systemctl start sshd 2>&1 | tee -a /var/log/cloud-init-userdata.log',
+  `# Ensure wheel group has sudo privileges for ${username} user`,
+  'echo "%wheel ALL=(ALL) NOPASSWD: ALL" | tee /etc/sudoers.d/wheel',
+  'chmod 0440 /etc/sudoers.d/wheel',
+  `# Enhanced ${username} user creation for Rocky Linux with comprehensive debugging`,
+  'echo "=== User Creation Debug Information ===" | tee -a /var/log/cloud-init-userdata.log',
+  'echo "OS Type: Rocky/RHEL/CentOS detected" | tee -a /var/log/cloud-init-userdata.log',
+  'echo "Available groups:" | tee -a /var/log/cloud-init-userdata.log',
+  'getent group wheel docker 2>&1 | tee -a /var/log/cloud-init-userdata.log',
+  `echo "Checking if ${username} user exists..." | tee -a /var/log/cloud-init-userdata.log`,
+  `if id ${username} >/dev/null 2>&1; then echo "GOOD: ${username} user already exists from cloud-init" | tee -a /var/log/cloud-init-userdata.log; else echo "WARNING: ${username} user not found, creating manually..." | tee -a /var/log/cloud-init-userdata.log; fi`,
+  `if ! id ${username} >/dev/null 2>&1; then`,
+  `  echo "Step 1: Creating ${username} user with useradd..." | tee -a /var/log/cloud-init-userdata.log`,
+  `  useradd -m -s /bin/bash ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log`,
+  `  echo "Step 2: Setting password for ${username} user..." | tee -a /var/log/cloud-init-userdata.log`, 
+  `  echo "${username}:${password}" | chpasswd 2>&1 | tee -a /var/log/cloud-init-userdata.log`,
+  `  echo "Step 3: Adding ${username} to wheel group..." | tee -a /var/log/cloud-init-userdata.log`,
+  `  usermod -aG wheel ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log`,
+  `  echo "Step 4: Adding ${username} to docker group (if exists)..." | tee -a /var/log/cloud-init-userdata.log`,
+  `  getent group docker >/dev/null && usermod -aG docker ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "Docker group not found, skipping..." | tee -a /var/log/cloud-init-userdata.log`,
+  '  echo "Manual user creation completed" | tee -a /var/log/cloud-init-userdata.log',
+  'fi',
+  `# Final verification of ${username} user`,
+  'echo "=== Final User Verification ===" | tee -a /var/log/cloud-init-userdata.log',
+  `id ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: ${username} user still not found!" | tee -a /var/log/cloud-init-userdata.log`,
+  `groups ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: cannot check ${username} user groups" | tee -a /var/log/cloud-init-userdata.log`,
+  `getent passwd ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: ${username} user not in passwd database" | tee -a /var/log/cloud-init-userdata.log`,
+  'echo "Rocky Linux base configuration completed" | tee -a /var/log/cloud-init-userdata.log'
+].join('\n');
+
+const ubuntuUserScript = (username) => [
+  'systemctl enable ssh 2>&1 | tee -a /var/log/cloud-init-userdata.log',
+  'systemctl start ssh 2>&1 | tee -a /var/log/cloud-init-userdata.log',
+  `# Verify ${username} user was created with correct groups`,
+  `id ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "WARNING: ${username} user not found" | tee -a /var/log/cloud-init-userdata.log`,
+  `groups ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "WARNING: cannot check ${username} user groups" | tee -a /var/log/cloud-init-userdata.log`,
+  'echo "Ubuntu base configuration completed" | tee -a /var/log/cloud-init-userdata.log'
+].join('\n');
+
+// Commands used instead of the user scripts when no user is configured
+const ROCKY_NO_USER_COMMANDS = [
+  'systemctl enable sshd 2>&1 | tee -a /var/log/cloud-init-userdata.log',
+  'systemctl start sshd 2>&1 | tee -a /var/log/cloud-init-userdata.log',
+  'echo "Rocky Linux base configuration completed (no user configured)" | tee -a /var/log/cloud-init-userdata.log'
+];
+
+const UBUNTU_NO_USER_COMMANDS = [
+  'systemctl enable ssh 2>&1 | tee -a /var/log/cloud-init-userdata.log',
+  'systemctl start ssh 2>&1 | tee -a /var/log/cloud-init-userdata.log',
+  'echo "Ubuntu base configuration completed (no user configured)" | tee -a /var/log/cloud-init-userdata.log'
+];
+
+// Installs DOCA from the Mellanox repository matching the detected OS, written to /tmp/install_doca.sh
+const DOCA_INSTALL_SCRIPT = `#!/bin/bash
+set -e
+echo "Starting DOCA installation" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+cd /tmp
+
+# Detect OS
+echo "=== OS Detection for DOCA ===" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+if [ -f /etc/os-release ]; then
+    source /etc/os-release
+    OS_NAME=$ID
+    OS_VERSION=$VERSION_ID
+    OS_MAJOR_VERSION=\${VERSION_ID%%.*}
+    echo "Detected OS: $OS_NAME $OS_VERSION (Major: $OS_MAJOR_VERSION)" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+else
+    echo "Cannot detect OS, defaulting to Ubuntu 22.04" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+    OS_NAME="ubuntu"
+    OS_VERSION="22.04"
+    OS_MAJOR_VERSION="22"
+fi
+
+# Install DOCA based on OS
+echo "Installing DOCA for $OS_NAME $OS_VERSION..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+
+if [[ "$OS_NAME" == "ubuntu" ]]; then
+    # Ubuntu DOCA installation
+    echo "Setting up DOCA for Ubuntu..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+    
+    # Determine repository based on version (use 22.04 repo for 24.04 compatibility)
+    if [[ "$OS_VERSION" == "20.04" ]]; then
+        DOCA_REPO_URL="https://linux.mellanox.com/public/repo/doca/3.1.0/ubuntu20.04/x86_64/"
+    else
+        # Use 22.04 repo for 22.04, 24.04, and unknown versions
+        DOCA_REPO_URL="https://linux.mellanox.com/public/repo/doca/3.1.0/ubuntu22.04/x86_64/"
+    fi
+    
+    echo "Using DOCA repository: $DOCA_REPO_URL" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+    
+    # Install DOCA step by step
+    echo "Step 1: Adding Mellanox GPG key..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+    curl -fsSL https://linux.mellanox.com/public/repo/doca/GPG-KEY-Mellanox.pub | gpg --dearmor > /etc/apt/trusted.gpg.d/GPG-KEY-Mellanox.pub || exit 1
+    
+    echo "Step 2: Adding DOCA repository..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+    echo "deb [signed-by=/etc/apt/trusted.gpg.d/GPG-KEY-Mellanox.pub] $DOCA_REPO_URL ./" > /etc/apt/sources.list.d/doca.list || exit 1
+    
+    echo "Step 3: Updating package lists..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+    apt-get update 2>&1 | tee -a /var/log/cloud-init-userdata.log || exit 1
+    
+    echo "Step 4: Installing doca-all package..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+    apt-get -y install doca-all 2>&1 | tee -a /var/log/cloud-init-userdata.log || exit 1
+    
+elif [[ "$OS_NAME" == "rocky" || "$OS_NAME" == "rhel" || "$OS_NAME" == "centos" ]]; then
+    # Rocky/RHEL DOCA installation
+    echo "Setting up DOCA for $OS_NAME $OS_MAJOR_VERSION..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+    
+    # Create DOCA repository configuration
+    cat > /etc/yum.repos.d/doca.repo << EOF
+[doca]
+name=DOCA Online Repo
+baseurl=https://linux.mellanox.com/public/repo/doca/3.1.0/rhel\${OS_MAJOR_VERSION}.0/x86_64/
+enabled=1
+gpgcheck=0
+EOF
+    
+    echo "Step 1: Cleaning package cache..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+    dnf clean all 2>&1 | tee -a /var/log/cloud-init-userdata.log || exit 1
+    
+    echo "Step 2: Installing doca-ofed package..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+    dnf -y install doca-ofed 2>&1 | tee -a /var/log/cloud-init-userdata.log || exit 1
+    
+else
+    echo "OS $OS_NAME not supported for DOCA installation" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+    exit 1
+fi
+
+echo "DOCA installation completed successfully" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
+`;
+
+// Enhancements a machine's tags can enable, also the indices into ENHANCEMENT_DESCRIPTIONS
+const ENHANCEMENT = {
+  HIGH_CPU: 0,
+  HIGH_MEMORY: 1,
+  BCM57508: 2,
+  AMD64_ARCH: 3,
+  VIRTUAL: 4,
+  SERIAL_CONSOLE: 5,
+  NVME_CORE: 6,
+  CONNECTX: 7,
+  DOCA: 8,
+  INTEL_NIC: 9,
+  BROADCOM: 10
+};
+
+// Descriptions of the tag-based enhancements, in the order they are listed
+const ENHANCEMENT_DESCRIPTIONS = [
+  'CPU performance optimizations (performance governor)',
+  'Memory optimizations (swappiness, cache pressure)',
+  'Broadcom BCM57508 network driver configuration',
+  'AMD64 microcode updates',
+  'Virtual machine guest tools',
+  'Serial console access configuration',
+  'NVME multipath configuration',
+  'ConnectX NIC driver loading (mlx5_core, mlx5_ib)',
+  'DOCA installation (doca-all for Ubuntu, doca-ofed for Rocky/RHEL)',
+  'Intel NIC driver optimization',
+  'Enhanced Broadcom NIC driver support'
+];
+
+// Tags that enable an enhancement by exact name
+const EXACT_TAG_ENHANCEMENTS = new Map([
+  ['high-cpu', ENHANCEMENT.HIGH_CPU],
+  ['high-memory', ENHANCEMENT.HIGH_MEMORY],
+  ['bcm57508', ENHANCEMENT.BCM57508],
+  ['amd64-arch', ENHANCEMENT.AMD64_ARCH],
+  ['virtual', ENHANCEMENT.VIRTUAL],
+  ['serial_console', ENHANCEMENT.SERIAL_CONSOLE],
+  ['needs_serial_console_deploy', ENHANCEMENT.SERIAL_CONSOLE],
+  ['nvme_core', ENHANCEMENT.NVME_CORE]
+]);
+
+// Tag families matched by a substring of the lowercased tag
+// FUZZY_TAG_PATTERN matches any tag that can belong to one of them, so other tags skip the family checks
+const FUZZY_TAG_PATTERN = /connectx|mellanox|doca|intel|broadcom/i;
+const FUZZY_TAG_ENHANCEMENTS = [
+  [tag => tag.includes('connectx') || tag.includes('mellanox'), ENHANCEMENT.CONNECTX],
+  [tag => tag.includes('doca'), ENHANCEMENT.DOCA],
+  [tag => tag.includes('intel') && (tag.includes('nic') || tag.includes('ethernet')), ENHANCEMENT.INTEL_NIC],
+  [tag => tag.includes('broadcom'), ENHANCEMENT.BROADCOM]
+];
+
+/**
+ * Work out which enhancements a list of tags enables, indexed by ENHANCEMENT
+ * Each tag is looked up once and lowercased at most once; the config builder and the
+ * enhancement descriptions both classify tags through this
+ */
+const classifyTags = (tags) => {
+  const enabled = new Array(ENHANCEMENT_DESCRIPTIONS.length).fill(false);
+
+  for (const tag of tags) {
+    const exact = EXACT_TAG_ENHANCEMENTS.get(tag);
+    if (exact !== undefined) {
+      enabled[exact] = true;
+    }
+
+    if (!FUZZY_TAG_PATTERN.test(tag)) continue;
+
+    // A tag can belong to several families, e.g. doca-connectx, so every family is checked
+    const lowerTag = tag.toLowerCase();
+    for (const [matches, index] of FUZZY_TAG_ENHANCEMENTS) {
+      if (matches(lowerTag)) {
+        enabled[index] = true;
+      }
+    }
+  }
+
+  return enabled;
+};
+
+// Generated configs are cached per input, the caches are cleared once they grow past this size
+const MAX_CACHED_CONFIGS = 64;
+
+// Copy the lists of a cached config so callers can't modify the cached one
+const copyConfigLists = (config) => ({
+  ...config,
+  packages: [...config.packages],
+  runcmd: [...config.runcmd],
+  write_files: [...config.write_files]
+});
+
+// Look up a cached config, building and storing it on a miss
+const getCachedConfig = (cache, key, build) => {
+  let config = cache.get(key);
+  if (!config) {
+    if (cache.size >= MAX_CACHED_CONFIGS) cache.clear();
+    config = build();
+    cache.set(key, config);
+  }
+  return copyConfigLists(config);
+};
+
+const baseCloudInitCache = new Map();
+const tagEnhancementsCache = new Map();
+
+// Rocky, RHEL and CentOS share packages and commands, everything else is treated as Ubuntu
+const isRockyOsType = (osType) => {
+  const os = osType.toLowerCase();
+  return os.includes('rocky') || os.includes('rhel') || os.includes('centos');
+};
+
 /**
  * Generate base cloud-init configuration with common settings
  * Now OS-aware for Rocky/RHEL vs Ubuntu differences
+ * The result only depends on the OS family and credentials, so it is built once per combination
+ * Callers that already know the OS family can pass isRocky to skip detecting it again
  */
-const generateBaseCloudInit = (osType = 'ubuntu', userCredentials = null) => {
-  const isRocky = osType.toLowerCase().includes('rocky') || 
-                  osType.toLowerCase().includes('rhel') || 
-                  osType.toLowerCase().includes('centos');
-  
+const generateBaseCloudInit = (osType = 'ubuntu', userCredentials = null, isRocky = isRockyOsType(osType)) => {
+  const key = JSON.stringify([
+    isRocky,
+    userCredentials ? userCredentials.configured !== false : null,
+    String(userCredentials?.username),
+    Boolean(userCredentials?.username),
+    String(userCredentials?.password),
+    Boolean(userCredentials?.password)
+  ]);
+  return getCachedConfig(baseCloudInitCache, key, () => buildBaseCloudInit(isRocky, userCredentials));
+};
+
+const buildBaseCloudInit = (isRocky, userCredentials) => {
   const config = {
     // OS-specific packages
-    packages: isRocky ? [
-      'curl',
-      'wget',
-      'git',
-      'htop',
-      'vim',
-      'net-tools',
-      'openssh-server',
-      'sudo', // Ensure sudo is installed on Rocky
-      'tar',
-      'gzip',
-      // Additional system tools
-      'lldpd',
-      'nvme-cli',
-      'strace',
-      'ltrace',
-      'crash',
-      'kexec-tools', // Rocky equivalent of kdump-tools
-      'ibverbs-utils',
-      'infiniband-diags',
-      'screen',
-      'tmux',
-      'ipmitool',
-      'rdma-core',
-      'wireshark-cli', // Rocky equivalent of tshark
-      'fio',
-      'smartmontools',
-      'atop'
-    ] : [
-      'curl',
-      'wget',
-      'git',
-      'htop',
-      'vim',
-      'net-tools',
-      'openssh-server',
-      // Additional system tools
-      'lldpd',
-      'nvme-cli',
-      'strace',
-      'ltrace',
-      'crash',
-      'kdump-tools',
-      'ibverbs-utils',
-      'ibutils',
-      'infiniband-diags',
-      'screen',
-      'tmux',
-      'ipmitool',
-      'rdma-core',
-      'tshark',
-      'termshark',
-      'fio',
-      'smartmontools',
-      'iozone3',
-      'atop'
-    ],
+    packages: isRocky ? ROCKY_BASE_PACKAGES : UBUNTU_BASE_PACKAGES,
     
     // Basic system configuration
     ssh_pwauth: true,
@@ -99,81 +393,14 @@ const generateBaseCloudInit = (osType = 'ubuntu', userCredentials = null) => {
   }
 
   // Add user-specific run commands only if user is configured
-  const userSpecificCommands = [];
   const username = userCredentials?.username;
+  let userSpecificCommands;
   
   if (userCredentials && userCredentials.configured !== false && username) {
-    const password = userCredentials.password;
-    
-    if (isRocky) {
-      userSpecificCommands.push(
-        `# CRITICAL: Force ${username} user creation immediately (Rocky Linux compatibility)`,
-        'echo "=== EMERGENCY USER CREATION ===" | tee -a /var/log/cloud-init-userdata.log',
-        `if ! id ${username} >/dev/null 2>&1; then`,
-        `  echo "Cloud-init user creation appears to have failed. Creating ${username} user manually NOW..." | tee -a /var/log/cloud-init-userdata.log`,
-        `  useradd -m -s /bin/bash ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: useradd failed" | tee -a /var/log/cloud-init-userdata.log`,
-        `  echo "${username}:${password}" | chpasswd 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: chpasswd failed" | tee -a /var/log/cloud-init-userdata.log`,
-        `  usermod -aG wheel ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: usermod wheel failed" | tee -a /var/log/cloud-init-userdata.log`,
-        `  id ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log`,
-        '  echo "Emergency user creation completed" | tee -a /var/log/cloud-init-userdata.log',
-        'else',
-        `  echo "GOOD: ${username} user exists, skipping emergency creation" | tee -a /var/log/cloud-init-userdata.log`,
-        'fi',
-        'systemctl enable sshd 2>&1 | tee -a /var/log/cloud-init-userdata.log',
-        'systemctl start sshd 2>&1 | tee -a /var/log/cloud-init-userdata.log',
-        `# Ensure wheel group has sudo privileges for ${username} user`,
-        'echo "%wheel ALL=(ALL) NOPASSWD: ALL" | tee /etc/sudoers.d/wheel',
-        'chmod 0440 /etc/sudoers.d/wheel',
-        `# Enhanced ${username} user creation for Rocky Linux with comprehensive debugging`,
-        'echo "=== User Creation Debug Information ===" | tee -a /var/log/cloud-init-userdata.log',
-        'echo "OS Type: Rocky/RHEL/CentOS detected" | tee -a /var/log/cloud-init-userdata.log',
-        'echo "Available groups:" | tee -a /var/log/cloud-init-userdata.log',
-        'getent group wheel docker 2>&1 | tee -a /var/log/cloud-init-userdata.log',
-        `echo "Checking if ${username} user exists..." | tee -a /var/log/cloud-init-userdata.log`,
-        `if id ${username} >/dev/null 2>&1; then echo "GOOD: ${username} user already exists from cloud-init" | tee -a /var/log/cloud-init-userdata.log; else echo "WARNING: ${username} user not found, creating manually..." | tee -a /var/log/cloud-init-userdata.log; fi`,
-        `if ! id ${username} >/dev/null 2>&1; then`,
-        `  echo "Step 1: Creating ${username} user with useradd..." | tee -a /var/log/cloud-init-userdata.log`,
-        `  useradd -m -s /bin/bash ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log`,
-        `  echo "Step 2: Setting password for ${username} user..." | tee -a /var/log/cloud-init-userdata.log`, 
-        `  echo "${username}:${password}" | chpasswd 2>&1 | tee -a /var/log/cloud-init-userdata.log`,
-        `  echo "Step 3: Adding ${username} to wheel group..." | tee -a /var/log/cloud-init-userdata.log`,
-        `  usermod -aG wheel ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log`,
-        `  echo "Step 4: Adding ${username} to docker group (if exists)..." | tee -a /var/log/cloud-init-userdata.log`,
-        `  getent group docker >/dev/null && usermod -aG docker ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "Docker group not found, skipping..." | tee -a /var/log/cloud-init-userdata.log`,
-        '  echo "Manual user creation completed" | tee -a /var/log/cloud-init-userdata.log',
-        'fi',
-        `# Final verification of ${username} user`,
-        'echo "=== Final User Verification ===" | tee -a /var/log/cloud-init-userdata.log',
-        `id ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: ${username} user still not found!" | tee -a /var/log/cloud-init-userdata.log`,
-        `groups ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: cannot check ${username} user groups" | tee -a /var/log/cloud-init-userdata.log`,
-        `getent passwd ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "ERROR: ${username} user not in passwd database" | tee -a /var/log/cloud-init-userdata.log`,
-        'echo "Rocky Linux base configuration completed" | tee -a /var/log/cloud-init-userdata.log'
-      );
-    } else {
-      userSpecificCommands.push(
-        'systemctl enable ssh 2>&1 | tee -a /var/log/cloud-init-userdata.log',
-        'systemctl start ssh 2>&1 | tee -a /var/log/cloud-init-userdata.log',
-        `# Verify ${username} user was created with correct groups`,
-        `id ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "WARNING: ${username} user not found" | tee -a /var/log/cloud-init-userdata.log`,
-        `groups ${username} 2>&1 | tee -a /var/log/cloud-init-userdata.log || echo "WARNING: cannot check ${username} user groups" | tee -a /var/log/cloud-init-userdata.log`,
-        'echo "Ubuntu base configuration completed" | tee -a /var/log/cloud-init-userdata.log'
-      );
-    }
+    userSpecificCommands = [isRocky ? rockyUserScript(username, userCredentials.password) : ubuntuUserScript(username)];
   } else {
     // No user configuration - just basic system setup
-    if (isRocky) {
-      userSpecificCommands.push(
-        'systemctl enable sshd 2>&1 | tee -a /var/log/cloud-init-userdata.log',
-        'systemctl start sshd 2>&1 | tee -a /var/log/cloud-init-userdata.log',
-        'echo "Rocky Linux base configuration completed (no user configured)" | tee -a /var/log/cloud-init-userdata.log'
-      );
-    } else {
-      userSpecificCommands.push(
-        'systemctl enable ssh 2>&1 | tee -a /var/log/cloud-init-userdata.log',
-        'systemctl start ssh 2>&1 | tee -a /var/log/cloud-init-userdata.log',
-        'echo "Ubuntu base configuration completed (no user configured)" | tee -a /var/log/cloud-init-userdata.log'
-      );
-    }
+    userSpecificCommands = isRocky ? ROCKY_NO_USER_COMMANDS : UBUNTU_NO_USER_COMMANDS;
   }
 
   return {
@@ -182,19 +409,7 @@ const generateBaseCloudInit = (osType = 'ubuntu', userCredentials = null) => {
     // System configuration files
     write_files: [
       {
-        content: `# installed from platform cloud-init
-kernel.numa_balancing=0
-kernel.softlockup_all_cpu_backtrace=1
-kernel.panic = 300
-net.ipv4.conf.all.arp_announce = 2
-net.ipv4.conf.all.arp_filter = 1
-net.ipv4.conf.all.arp_ignore = 1
-net.ipv4.conf.default.arp_announce = 2
-net.ipv4.conf.default.arp_filter = 1
-net.ipv4.conf.default.arp_ignore = 1
-net.ipv4.conf.all.ignore_routes_with_linkdown = 1
-net.ipv4.conf.default.ignore_routes_with_linkdown = 1
-`,
+        content: WEKA_SYSCTL_CONF,
         path: '/etc/sysctl.d/99-weka.conf'
       }
     ],
@@ -226,24 +441,33 @@ net.ipv4.conf.default.ignore_routes_with_linkdown = 1
 
 /**
  * Generate tag-specific enhancements based on machine tags
+ * Tag order and duplicates don't affect the result, so it is built once per OS family and tag set
  */
-const generateTagBasedEnhancements = (tags, osType = 'ubuntu') => {
+const generateTagBasedEnhancements = (tags, osType = 'ubuntu', isRocky = isRockyOsType(osType)) => {
+  if (!tags || tags.length === 0) {
+    return {
+      packages: [],
+      runcmd: [],
+      write_files: []
+    };
+  }
+
+  const key = JSON.stringify([isRocky, [...new Set(tags)].sort()]);
+  return getCachedConfig(tagEnhancementsCache, key, () => buildTagBasedEnhancements(tags, isRocky));
+};
+
+const buildTagBasedEnhancements = (tags, isRocky) => {
   const enhancements = {
     packages: [],
     runcmd: [],
     write_files: []
   };
 
-  if (!tags || tags.length === 0) {
-    return enhancements;
-  }
-
-  const isRocky = osType.toLowerCase().includes('rocky') || 
-                  osType.toLowerCase().includes('rhel') || 
-                  osType.toLowerCase().includes('centos');
+  // Exact tag names are matched case-sensitively, tag families by a case-insensitive substring
+  const enabled = classifyTags(tags);
 
   // High-CPU machines - performance optimizations
-  if (tags.includes('high-cpu')) {
+  if (enabled[ENHANCEMENT.HIGH_CPU]) {
     if (isRocky) {
       enhancements.packages.push('kernel-tools');
     } else {
@@ -257,7 +481,7 @@ const generateTagBasedEnhancements = (tags, osType = 'ubuntu') => {
   }
 
   // High-memory machines - memory optimizations  
-  if (tags.includes('high-memory')) {
+  if (enabled[ENHANCEMENT.HIGH_MEMORY]) {
     enhancements.runcmd.push(
       'echo "=== High-Memory Optimizations ===" | tee -a /var/log/cloud-init-userdata.log',
       'echo "vm.swappiness=1" >> /etc/sysctl.conf 2>&1 | tee -a /var/log/cloud-init-userdata.log',
@@ -267,7 +491,7 @@ const generateTagBasedEnhancements = (tags, osType = 'ubuntu') => {
   }
 
   // Network card specific configurations
-  if (tags.includes('bcm57508')) {
+  if (enabled[ENHANCEMENT.BCM57508]) {
     enhancements.packages.push('ethtool');
     enhancements.runcmd.push(
       'echo "=== Broadcom BCM57508 Configuration ===" | tee -a /var/log/cloud-init-userdata.log',
@@ -277,7 +501,7 @@ const generateTagBasedEnhancements = (tags, osType = 'ubuntu') => {
   }
 
   // AMD64 architecture optimizations
-  if (tags.includes('amd64-arch')) {
+  if (enabled[ENHANCEMENT.AMD64_ARCH]) {
     enhancements.packages.push('amd64-microcode');
     enhancements.runcmd.push(
       'echo "=== AMD64 Architecture Optimizations ===" | tee -a /var/log/cloud-init-userdata.log',
@@ -286,7 +510,7 @@ const generateTagBasedEnhancements = (tags, osType = 'ubuntu') => {
   }
 
   // Virtual machine specific settings
-  if (tags.includes('virtual')) {
+  if (enabled[ENHANCEMENT.VIRTUAL]) {
     enhancements.packages.push('qemu-guest-agent', 'open-vm-tools');
     enhancements.runcmd.push(
       'echo "=== Virtual Machine Configuration ===" | tee -a /var/log/cloud-init-userdata.log',
@@ -296,7 +520,7 @@ const generateTagBasedEnhancements = (tags, osType = 'ubuntu') => {
   }
 
   // Serial console support
-  if (tags.includes('serial_console') || tags.includes('needs_serial_console_deploy')) {
+  if (enabled[ENHANCEMENT.SERIAL_CONSOLE]) {
     enhancements.runcmd.push(
       'echo "=== Serial Console Configuration ===" | tee -a /var/log/cloud-init-userdata.log',
       'systemctl enable serial-getty@ttyS0.service 2>&1 | tee -a /var/log/cloud-init-userdata.log',
@@ -306,7 +530,7 @@ const generateTagBasedEnhancements = (tags, osType = 'ubuntu') => {
   }
 
   // NVME storage optimizations
-  if (tags.includes('nvme_core')) {
+  if (enabled[ENHANCEMENT.NVME_CORE]) {
     enhancements.write_files.push({
       content: 'nvme_core.multipath=N\n',
       path: '/etc/modprobe.d/nvme.conf'
@@ -318,12 +542,7 @@ const generateTagBasedEnhancements = (tags, osType = 'ubuntu') => {
   }
 
   // ConnectX NIC support (basic driver loading only)
-  const connectxTags = tags.filter(tag => 
-    tag.toLowerCase().includes('connectx') || 
-    tag.toLowerCase().includes('mellanox')
-  );
-  
-  if (connectxTags.length > 0) {
+  if (enabled[ENHANCEMENT.CONNECTX]) {
     enhancements.runcmd.push(
       'echo "=== ConnectX NIC Driver Loading ===" | tee -a /var/log/cloud-init-userdata.log',
       'modprobe mlx5_core 2>&1 | tee -a /var/log/cloud-init-userdata.log || true',
@@ -333,11 +552,7 @@ const generateTagBasedEnhancements = (tags, osType = 'ubuntu') => {
   }
 
   // DOCA installation support (triggered by DOCA tag)
-  const docaTags = tags.filter(tag => 
-    tag.toLowerCase().includes('doca')
-  );
-  
-  if (docaTags.length > 0) {
+  if (enabled[ENHANCEMENT.DOCA]) {
     // Add OS-specific packages for building drivers
     if (isRocky) {
       enhancements.packages.push('gcc', 'kernel-devel', 'kernel-headers', 'wget', 'python3-pip', 'curl', 'rpm-build');
@@ -347,82 +562,7 @@ const generateTagBasedEnhancements = (tags, osType = 'ubuntu') => {
     
     // Add DOCA installation script as a file
     enhancements.write_files.push({
-      content: `#!/bin/bash
-set -e
-echo "Starting DOCA installation" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-cd /tmp
-
-# Detect OS
-echo "=== OS Detection for DOCA ===" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-if [ -f /etc/os-release ]; then
-    source /etc/os-release
-    OS_NAME=$ID
-    OS_VERSION=$VERSION_ID
-    OS_MAJOR_VERSION=\${VERSION_ID%%.*}
-    echo "Detected OS: $OS_NAME $OS_VERSION (Major: $OS_MAJOR_VERSION)" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-else
-    echo "Cannot detect OS, defaulting to Ubuntu 22.04" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-    OS_NAME="ubuntu"
-    OS_VERSION="22.04"
-    OS_MAJOR_VERSION="22"
-fi
-
-# Install DOCA based on OS
-echo "Installing DOCA for $OS_NAME $OS_VERSION..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-
-if [[ "$OS_NAME" == "ubuntu" ]]; then
-    # Ubuntu DOCA installation
-    echo "Setting up DOCA for Ubuntu..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-    
-    # Determine repository based on version (use 22.04 repo for 24.04 compatibility)
-    if [[ "$OS_VERSION" == "20.04" ]]; then
-        DOCA_REPO_URL="https://linux.mellanox.com/public/repo/doca/3.1.0/ubuntu20.04/x86_64/"
-    else
-        # Use 22.04 repo for 22.04, 24.04, and unknown versions
-        DOCA_REPO_URL="https://linux.mellanox.com/public/repo/doca/3.1.0/ubuntu22.04/x86_64/"
-    fi
-    
-    echo "Using DOCA repository: $DOCA_REPO_URL" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-    
-    # Install DOCA step by step
-    echo "Step 1: Adding Mellanox GPG key..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-    curl -fsSL https://linux.mellanox.com/public/repo/doca/GPG-KEY-Mellanox.pub | gpg --dearmor > /etc/apt/trusted.gpg.d/GPG-KEY-Mellanox.pub || exit 1
-    
-    echo "Step 2: Adding DOCA repository..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-    echo "deb [signed-by=/etc/apt/trusted.gpg.d/GPG-KEY-Mellanox.pub] $DOCA_REPO_URL ./" > /etc/apt/sources.list.d/doca.list || exit 1
-    
-    echo "Step 3: Updating package lists..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-    apt-get update 2>&1 | tee -a /var/log/cloud-init-userdata.log || exit 1
-    
-    echo "Step 4: Installing doca-all package..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-    apt-get -y install doca-all 2>&1 | tee -a /var/log/cloud-init-userdata.log || exit 1
-    
-elif [[ "$OS_NAME" == "rocky" || "$OS_NAME" == "rhel" || "$OS_NAME" == "centos" ]]; then
-    # Rocky/RHEL DOCA installation
-    echo "Setting up DOCA for $OS_NAME $OS_MAJOR_VERSION..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-    
-    # Create DOCA repository configuration
-    cat > /etc/yum.repos.d/doca.repo << EOF
-[doca]
-name=DOCA Online Repo
-baseurl=https://linux.mellanox.com/public/repo/doca/3.1.0/rhel\${OS_MAJOR_VERSION}.0/x86_64/
-enabled=1
-gpgcheck=0
-EOF
-    
-    echo "Step 1: Cleaning package cache..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-    dnf clean all 2>&1 | tee -a /var/log/cloud-init-userdata.log || exit 1
-    
-    echo "Step 2: Installing doca-ofed package..." | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-    dnf -y install doca-ofed 2>&1 | tee -a /var/log/cloud-init-userdata.log || exit 1
-    
-else
-    echo "OS $OS_NAME not supported for DOCA installation" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-    exit 1
-fi
-
-echo "DOCA installation completed successfully" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log
-`,
+      content: DOCA_INSTALL_SCRIPT,
       path: '/tmp/install_doca.sh'
     });
     
@@ -435,12 +575,7 @@ echo "DOCA installation completed successfully" | tee -a /var/log/cloud-init-use
   }
 
   // Intel NIC support
-  const intelNicTags = tags.filter(tag => 
-    tag.toLowerCase().includes('intel') && 
-    (tag.toLowerCase().includes('nic') || tag.toLowerCase().includes('ethernet'))
-  );
-  
-  if (intelNicTags.length > 0) {
+  if (enabled[ENHANCEMENT.INTEL_NIC]) {
     if (isRocky) {
       enhancements.packages.push('gcc', 'kernel-devel', 'kernel-headers');
     } else {
@@ -458,7 +593,7 @@ echo "DOCA installation completed successfully" | tee -a /var/log/cloud-init-use
   }
 
   // Broadcom NIC support (enhanced)
-  if (tags.includes('bcm57508') || tags.some(tag => tag.toLowerCase().includes('broadcom'))) {
+  if (enabled[ENHANCEMENT.BCM57508] || enabled[ENHANCEMENT.BROADCOM]) {
     if (isRocky) {
       enhancements.packages.push('ethtool', 'gcc', 'kernel-devel', 'kernel-headers');
     } else {
@@ -477,26 +612,20 @@ echo "DOCA installation completed successfully" | tee -a /var/log/cloud-init-use
 
 /**
  * Merge base configuration with tag-based enhancements and user customizations
+ * The merged config gets its own lists, the base configuration is never modified
  */
 const mergeConfigurations = (baseConfig, enhancements, userConfig = '') => {
   // Start with base configuration
   const finalConfig = { ...baseConfig };
 
-  // Merge packages
-  if (enhancements.packages && enhancements.packages.length > 0) {
-    finalConfig.packages = [...finalConfig.packages, ...enhancements.packages];
-  }
+  // Merge packages, several tags can ask for the same package so each is listed once
+  finalConfig.packages = [...new Set([...baseConfig.packages, ...(enhancements.packages || [])])];
 
   // Merge run commands
-  if (enhancements.runcmd && enhancements.runcmd.length > 0) {
-    finalConfig.runcmd = [...finalConfig.runcmd, ...enhancements.runcmd];
-  }
+  finalConfig.runcmd = [...baseConfig.runcmd, ...(enhancements.runcmd || [])];
 
   // Add write_files if any
-  if (enhancements.write_files && enhancements.write_files.length > 0) {
-    finalConfig.write_files = finalConfig.write_files || [];
-    finalConfig.write_files = [...finalConfig.write_files, ...enhancements.write_files];
-  }
+  finalConfig.write_files = [...(baseConfig.write_files || []), ...(enhancements.write_files || [])];
 
   // If user provided custom config, try to merge it intelligently
   if (userConfig.trim()) {
@@ -524,85 +653,259 @@ const mergeConfigurations = (baseConfig, enhancements, userConfig = '') => {
   return finalConfig;
 };
 
+/**
+ * Emit the YAML sections of the fixed cloud-init schema produced by this generator
+ * Each section pushes its lines onto `out`, ending with the blank line that separates it from the next one
+ */
+const emitUsers = (out, users, hidePasswords) => {
+  out.push('users:');
+  for (const user of users) {
+    out.push(
+      `  - name: ${user.name}`,
+      `    plain_text_passwd: '${hidePasswords ? '[HIDDEN]' : user.plain_text_passwd}'`,
+      `    sudo: '${user.sudo}'`,
+      `    shell: ${user.shell}`,
+      `    groups: [${user.groups.join(', ')}]`,
+      `    lock_passwd: ${user.lock_passwd}`
+    );
+  }
+  out.push('');
+};
+
+const emitWriteFiles = (out, writeFiles) => {
+  out.push('write_files:');
+  for (const file of writeFiles) {
+    out.push('  - content: |');
+    for (const line of file.content.split('\n')) {
+      out.push(`      ${line}`);
+    }
+    out.push(
+      `    path: ${file.path}`,
+      "    permissions: '0755'"
+    );
+  }
+  out.push('');
+};
+
+// runcmd entries are emitted with JSON.stringify: a JSON string is a valid YAML
+// double-quoted scalar, and it escapes backslashes and control characters too
+const emitRuncmdEntries = (out, runcmd) => {
+  for (const cmd of runcmd) {
+    out.push(`  - ${JSON.stringify(cmd)}`);
+  }
+};
+
+// The runcmd entries that close every deployment
+const emitRuncmdTail = (out, users) => {
+  out.push(
+    `  - "echo '=== MAAS Cloud-Init Deployment Completed at \$(date) ===' | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log"`,
+    `  - "echo 'All user-data logs saved to /var/log/cloud-init-userdata.log' | tee -a /var/log/maas-deployment.log"`,
+    `  - "echo 'Final user verification:' | tee -a /var/log/cloud-init-userdata.log"`,
+    users
+      ? `  - "id ${users[0].name} | tee -a /var/log/cloud-init-userdata.log || echo 'ERROR: ${users[0].name} user not created!' | tee -a /var/log/cloud-init-userdata.log"`
+      : `  - "echo 'No user configured for this deployment' | tee -a /var/log/cloud-init-userdata.log"`,
+    ''
+  );
+};
+
+/**
+ * Emit the YAML of a merged config that doesn't depend on the machine itself
+ * `head` runs from the users section up to the runcmd key, `tail` from the shared
+ * runcmd entries to the end of runcmd; the machine's own entries go in between
+ * With hidePasswords the user passwords are written as [HIDDEN], for display
+ */
+const emitSharedSections = (config, hidePasswords = false) => {
+  const head = [];
+
+  if (config.users) {
+    emitUsers(head, config.users, hidePasswords);
+  }
+
+  head.push(
+    `ssh_pwauth: ${config.ssh_pwauth}`,
+    `disable_root: ${config.disable_root}`,
+    '',
+    'packages:'
+  );
+  for (const pkg of config.packages) {
+    head.push(`  - ${pkg}`);
+  }
+  head.push('');
+
+  if (config.write_files && config.write_files.length > 0) {
+    emitWriteFiles(head, config.write_files);
+  } else {
+    head.push('');
+  }
+
+  head.push('runcmd:');
+
+  const tail = [];
+  emitRuncmdEntries(tail, config.runcmd);
+  emitRuncmdTail(tail, config.users);
+
+  return {
+    head: head.join('\n'),
+    tail: tail.join('\n')
+  };
+};
+
+/**
+ * Emit the complete cloud-init YAML for a machine
+ * The machine's header, hostname and runcmd entries are placed around the shared sections
+ */
+const emitCloudInitYaml = (sections, machine, details, machineRuncmd, generatedAt) => {
+  const out = [
+    '#cloud-config',
+    '# Auto-generated configuration for MAAS deployment',
+    `# Machine: ${details.displayName}`,
+    `# System ID: ${machine.system_id}`,
+    `# Architecture: ${machine.architecture}`,
+    `# CPU: ${machine.cpu_count} cores, Memory: ${details.memoryGb} GB`,
+    `# Machine tags: ${details.tagList}`,
+    `# Generated at: ${generatedAt}`,
+    '',
+    `hostname: ${details.hostname}`,
+    '',
+    sections.head
+  ];
+
+  emitRuncmdEntries(out, machineRuncmd);
+  out.push(
+    sections.tail,
+    `final_message: "MAAS deployment completed successfully for ${details.hostname} with Weka configurations"`,
+    ''
+  );
+
+  return out.join('\n');
+};
+
+// Fixed parts of the multi-machine summary display config, each joined into one string
+// so a summary only interpolates the machine list, tags and user name
+const SUMMARY_NOTE = [
+  '',
+  '# Note: Each machine will receive individualized configuration',
+  '# based on its specific tags and hardware configuration',
+  ''
+].join('\n');
+
+const SUMMARY_USER_SETTINGS = [
+  "    plain_text_passwd: '[HIDDEN]'",
+  "    sudo: 'ALL=(ALL) NOPASSWD:ALL'",
+  '    shell: /bin/bash',
+  '    groups: [sudo, docker]',
+  '    lock_passwd: false'
+].join('\n');
+
+const SUMMARY_NO_USER = '# No user configuration - machines will use default system access';
+
+const SUMMARY_FOOTER = [
+  '',
+  '# Individual machine configurations will be applied during deployment',
+  '# Each machine gets customized packages, drivers, and scripts based on its tags',
+  ''
+].join('\n');
+
+// Generation times are shown to the second, so batches generated within the same second share one string
+let cachedTimestamp = { second: -1, value: '' };
+const currentTimestamp = () => {
+  const second = Math.floor(Date.now() / 1000);
+  if (second !== cachedTimestamp.second) {
+    cachedTimestamp = { second, value: new Date(second * 1000).toISOString().replace('.000Z', 'Z') };
+  }
+  return cachedTimestamp.value;
+};
+
+// Shared tag list for machines without tag_names
+const NO_TAGS = Object.freeze([]);
+
+// Name a machine is shown by in headers, logs and summaries
+const machineDisplayName = (machine) => machine.hostname || machine.fqdn || machine.system_id;
+
+/**
+ * Build the machine-independent parts of a deployment once so every machine in a batch can share them
+ * All configs of a batch carry the same generation timestamp
+ */
+const createCloudInitContext = (osType = 'ubuntu', userCredentials = null, userConfig = '') => {
+  const isRocky = isRockyOsType(osType);
+  return {
+    osType,
+    isRocky,
+    userConfig,
+    baseConfig: generateBaseCloudInit(osType, userCredentials, isRocky),
+    generatedAt: currentTimestamp(),
+    // Merged configs and their emitted sections by tag set, machines with the same tags share them
+    sharedConfigs: new Map()
+  };
+};
+
+/**
+ * Merge and emit the configuration shared by all machines of a batch with the given tags
+ */
+const getSharedConfig = (context, machineTags) => {
+  const key = JSON.stringify([...new Set(machineTags)].sort());
+  let shared = context.sharedConfigs.get(key);
+
+  if (!shared) {
+    // Generate tag-based enhancements for these tags
+    const enhancements = generateTagBasedEnhancements(machineTags, context.osType, context.isRocky);
+
+    // Merge configurations
+    const config = mergeConfigurations(context.baseConfig, enhancements, context.userConfig);
+
+    shared = {
+      config,
+      sections: emitSharedSections(config),
+      hasEnhancements: enhancements.packages.length > 0 || 
+                       enhancements.runcmd.length > 0 || 
+                       enhancements.write_files.length > 0
+    };
+    context.sharedConfigs.set(key, shared);
+  }
+
+  return shared;
+};
+
 /**
  * Generate cloud-init configuration for a single machine
+ * With includeDisplayConfig the result also has a displayConfig without passwords
  */
-const generateMachineCloudInit = (machine, userConfig = '', osType = 'ubuntu', userCredentials = null) => {
-  const machineTags = machine.tag_names || [];
-  
-  // Generate base configuration with OS awareness
-  const baseConfig = generateBaseCloudInit(osType, userCredentials);
+const generateMachineCloudInit = (machine, context, includeDisplayConfig = false) => {
+  const machineTags = machine.tag_names || NO_TAGS;
+  const shared = getSharedConfig(context, machineTags);
   
-  // Generate tag-based enhancements for this specific machine
-  const enhancements = generateTagBasedEnhancements(machineTags, osType);
-  
-  // Merge configurations
-  const finalConfig = mergeConfigurations(baseConfig, enhancements, userConfig);
+  // Values shown both in the YAML header and in the runcmd log lines
+  const details = {
+    displayName: machineDisplayName(machine),
+    hostname: machine.hostname || machine.fqdn || `maas-${machine.system_id.slice(-8)}`,
+    // Memory is reported in MiB, rounded to the nearest GiB with integer arithmetic
+    memoryGb: (machine.memory + 512) >> 10,
+    tagList: machineTags.join(', ') || 'none'
+  };
   
-  // Add machine-specific information to runcmd with logging
+  // Machine-specific information logged at the start of runcmd
   const machineSpecificCmds = [
-    `echo "=== Machine-Specific Configuration ===" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log`,
-    `echo "Machine-specific deployment for ${machine.hostname || machine.fqdn || machine.system_id}" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log`,
-    `echo "System ID: ${machine.system_id}" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log`,
-    `echo "Architecture: ${machine.architecture}" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log`,
-    `echo "CPU Cores: ${machine.cpu_count}" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log`,
-    `echo "Memory: ${Math.round(machine.memory / 1024)} GB" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log`,
-    `echo "Machine Tags: ${machineTags.join(', ') || 'none'}" | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log`
+    `echo "=== Machine-Specific Configuration ===" ${TEE_BOTH_LOGS}`,
+    `echo "Machine-specific deployment for ${details.displayName}" ${TEE_BOTH_LOGS}`,
+    `echo "System ID: ${machine.system_id}" ${TEE_BOTH_LOGS}`,
+    `echo "Architecture: ${machine.architecture}" ${TEE_BOTH_LOGS}`,
+    `echo "CPU Cores: ${machine.cpu_count}" ${TEE_BOTH_LOGS}`,
+    `echo "Memory: ${details.memoryGb} GB" ${TEE_BOTH_LOGS}`,
+    `echo "Machine Tags: ${details.tagList}" ${TEE_BOTH_LOGS}`
   ];
   
-  finalConfig.runcmd = [...machineSpecificCmds, ...finalConfig.runcmd];
-  
-  // Set hostname in cloud-init
-  finalConfig.hostname = machine.hostname || machine.fqdn || `maas-${machine.system_id.slice(-8)}`;
-  
   // Convert to proper YAML string with correct formatting
-  const yamlString = `#cloud-config
-# Auto-generated configuration for MAAS deployment
-# Machine: ${machine.hostname || machine.fqdn || machine.system_id}
-# System ID: ${machine.system_id}
-# Architecture: ${machine.architecture}
-# CPU: ${machine.cpu_count} cores, Memory: ${Math.round(machine.memory / 1024)} GB
-# Machine tags: ${machineTags.join(', ') || 'none'}
-# Generated at: ${new Date().toISOString()}
-
-hostname: ${finalConfig.hostname}
-
-${finalConfig.users ? `users:
-${finalConfig.users.map(user => `  - name: ${user.name}
-    plain_text_passwd: '${user.plain_text_passwd}'
-    sudo: '${user.sudo}'
-    shell: ${user.shell}
-    groups: [${user.groups.join(', ')}]
-    lock_passwd: ${user.lock_passwd}`).join('\n')}
-
-` : ''}ssh_pwauth: ${finalConfig.ssh_pwauth}
-disable_root: ${finalConfig.disable_root}
-
-packages:
-${finalConfig.packages.map(pkg => `  - ${pkg}`).join('\n')}
-
-${finalConfig.write_files && finalConfig.write_files.length > 0 ? `write_files:
-${finalConfig.write_files.map(file => `  - content: |
-${file.content.split('\n').map(line => `      ${line}`).join('\n')}
-    path: ${file.path}
-    permissions: '0755'`).join('\n')}\n` : ''}
-runcmd:
-${finalConfig.runcmd.map(cmd => `  - "${cmd.replace(/"/g, '\\"')}"`).join('\n')}
-  - "echo '=== MAAS Cloud-Init Deployment Completed at \$(date) ===' | tee -a /var/log/cloud-init-userdata.log /var/log/maas-deployment.log"
-  - "echo 'All user-data logs saved to /var/log/cloud-init-userdata.log' | tee -a /var/log/maas-deployment.log"
-  - "echo 'Final user verification:' | tee -a /var/log/cloud-init-userdata.log"
-${finalConfig.users ? `  - "id ${finalConfig.users[0].name} | tee -a /var/log/cloud-init-userdata.log || echo 'ERROR: ${finalConfig.users[0].name} user not created!' | tee -a /var/log/cloud-init-userdata.log"` : '  - "echo \'No user configured for this deployment\' | tee -a /var/log/cloud-init-userdata.log"'}
-
-final_message: "MAAS deployment completed successfully for ${finalConfig.hostname} with Weka configurations"
-`;
+  const yamlString = emitCloudInitYaml(shared.sections, machine, details, machineSpecificCmds, context.generatedAt);
 
   return {
     config: yamlString,
+    ...(includeDisplayConfig && {
+      displayConfig: emitCloudInitYaml(emitSharedSections(shared.config, true), machine, details, machineSpecificCmds, context.generatedAt)
+    }),
     machine: machine,
+    displayName: details.displayName,
     tags: machineTags,
-    hasEnhancements: enhancements.packages.length > 0 || 
-                      enhancements.runcmd.length > 0 || 
-                      enhancements.write_files.length > 0
+    hasEnhancements: shared.hasEnhancements
   };
 };
 
@@ -611,64 +914,62 @@ final_message: "MAAS deployment completed successfully for ${finalConfig.hostnam
  * Now generates individual configs for each machine
  */
 export const generateCloudInit = (selectedMachines, userConfig = '', osType = 'ubuntu', userCredentials = null) => {
+  // The base configuration is the same for every machine in the batch
+  const context = createCloudInitContext(osType, userCredentials, userConfig);
+
   if (selectedMachines.length === 1) {
     // Single machine - return individual config
-    const machineConfig = generateMachineCloudInit(selectedMachines[0], userConfig, osType, userCredentials);
-    
-    // Create sanitized version for display (without password)
-    const sanitizedYamlString = machineConfig.config.replace(
-      /plain_text_passwd: '[^']*'/g, 
-      "plain_text_passwd: '[HIDDEN]'"
-    );
+    // The display version is emitted with the password hidden
+    const machineConfig = generateMachineCloudInit(selectedMachines[0], context, true);
     
     return {
       config: machineConfig.config,
-      displayConfig: sanitizedYamlString,
+      displayConfig: machineConfig.displayConfig,
       tags: machineConfig.tags,
       hasEnhancements: machineConfig.hasEnhancements,
       machineConfigs: [machineConfig] // For consistency
     };
   } else {
     // Multiple machines - generate individual configs for each
-    const machineConfigs = selectedMachines.map(machine => 
-      generateMachineCloudInit(machine, userConfig, osType, userCredentials)
-    );
-    
-    // Get all unique tags from all machines
-    const allTags = [...new Set(
-      selectedMachines.flatMap(machine => machine.tag_names || [])
-    )];
+    // The names, unique tags and whether any machine is enhanced are collected in the same pass
+    const machineConfigs = [];
+    const machineNames = [];
+    const tagSet = new Set();
+    let hasEnhancements = false;
+    for (const machine of selectedMachines) {
+      const machineConfig = generateMachineCloudInit(machine, context);
+      machineConfigs.push(machineConfig);
+      machineNames.push(machineConfig.displayName);
+      hasEnhancements = hasEnhancements || machineConfig.hasEnhancements;
+      for (const tag of machineConfig.tags) {
+        tagSet.add(tag);
+      }
+    }
+    const allTags = [...tagSet];
     
     // Create a summary display config showing all machines
-    const summaryConfig = `#cloud-config
-# Auto-generated configuration for MAAS deployment
-# Multiple machines: ${selectedMachines.length} machines
-# Machines: ${selectedMachines.map(m => m.hostname || m.fqdn || m.system_id).join(', ')}
-# All tags: ${allTags.join(', ') || 'none'}
-# Generated at: ${new Date().toISOString()}
-
-# Note: Each machine will receive individualized configuration
-# based on its specific tags and hardware configuration
-
-${userCredentials?.configured !== false ? `users:
-  - name: ${userCredentials?.username || 'user'}
-    plain_text_passwd: '[HIDDEN]'
-    sudo: 'ALL=(ALL) NOPASSWD:ALL'
-    shell: /bin/bash
-    groups: [sudo, docker]
-    lock_passwd: false` : '# No user configuration - machines will use default system access'}
-
-# Individual machine configurations will be applied during deployment
-# Each machine gets customized packages, drivers, and scripts based on its tags
-
-final_message: "MAAS deployment completed for ${selectedMachines.length} machines with individualized configurations"
-`;
+    const machineCount = selectedMachines.length;
+    const summaryConfig = [
+      '#cloud-config',
+      '# Auto-generated configuration for MAAS deployment',
+      `# Multiple machines: ${machineCount} machines`,
+      `# Machines: ${machineNames.join(', ')}`,
+      `# All tags: ${allTags.join(', ') || 'none'}`,
+      `# Generated at: ${context.generatedAt}`,
+      SUMMARY_NOTE,
+      userCredentials?.configured !== false
+        ? `users:\n  - name: ${userCredentials?.username || 'user'}\n${SUMMARY_USER_SETTINGS}`
+        : SUMMARY_NO_USER,
+      SUMMARY_FOOTER,
+      `final_message: "MAAS deployment completed for ${machineCount} machines with individualized configurations"`,
+      ''
+    ].join('\n');
 
     return {
       config: summaryConfig, // Summary for display
       displayConfig: summaryConfig,
       tags: allTags,
-      hasEnhancements: machineConfigs.some(config => config.hasEnhancements),
+      hasEnhancements,
       machineConfigs: machineConfigs // Individual configs for deployment
     };
   }
@@ -678,74 +979,49 @@ final_message: "MAAS deployment completed for ${selectedMachines.length} machine
  * Get individual machine configuration for deployment
  */
 export const getMachineCloudInit = (machine, userConfig = '', osType = 'ubuntu', userCredentials = null) => {
-  const machineConfig = generateMachineCloudInit(machine, userConfig, osType, userCredentials);
+  const machineConfig = generateMachineCloudInit(machine, createCloudInitContext(osType, userCredentials, userConfig));
   return machineConfig.config;
 };
 
+const enhancementDescriptionCache = new Map();
+// Description lists by the bitmask of enabled enhancements, tag sets that enable the same
+// enhancements share one list; there are at most 2^11 masks so this needs no eviction
+const descriptionsByMask = new Map();
+const STANDARD_CONFIGURATION_ONLY = Object.freeze(['Standard configuration only']);
+
 /**
  * Get description of what enhancements will be applied based on tags
+ * Tag order and duplicates don't affect the result, so it is worked out once per tag set
+ * The returned list is frozen and shared between calls with the same tags
  */
 export const getEnhancementDescription = (tags) => {
-  const descriptions = [];
-  
   if (!tags || tags.length === 0) {
-    return ['Standard configuration only'];
+    return STANDARD_CONFIGURATION_ONLY;
   }
 
-  if (tags.includes('high-cpu')) {
-    descriptions.push('CPU performance optimizations (performance governor)');
-  }
-  
-  if (tags.includes('high-memory')) {
-    descriptions.push('Memory optimizations (swappiness, cache pressure)');
-  }
-  
-  if (tags.includes('bcm57508')) {
-    descriptions.push('Broadcom BCM57508 network driver configuration');
+  const key = JSON.stringify([...new Set(tags)].sort());
+  let descriptions = enhancementDescriptionCache.get(key);
+  if (!descriptions) {
+    if (enhancementDescriptionCache.size >= MAX_CACHED_CONFIGS) enhancementDescriptionCache.clear();
+    descriptions = buildEnhancementDescription(tags);
+    enhancementDescriptionCache.set(key, descriptions);
   }
-  
-  if (tags.includes('amd64-arch')) {
-    descriptions.push('AMD64 microcode updates');
-  }
-  
-  if (tags.includes('virtual')) {
-    descriptions.push('Virtual machine guest tools');
-  }
-  
-  if (tags.includes('serial_console') || tags.includes('needs_serial_console_deploy')) {
-    descriptions.push('Serial console access configuration');
-  }
-  
-  if (tags.includes('nvme_core')) {
-    descriptions.push('NVME multipath configuration');
-  }
-  
-  const connectxTags = tags.filter(tag => 
-    tag.toLowerCase().includes('connectx') || 
-    tag.toLowerCase().includes('mellanox')
-  );
-  if (connectxTags.length > 0) {
-    descriptions.push('ConnectX NIC driver loading (mlx5_core, mlx5_ib)');
-  }
-  
-  const docaTags = tags.filter(tag => 
-    tag.toLowerCase().includes('doca')
-  );
-  if (docaTags.length > 0) {
-    descriptions.push('DOCA installation (doca-all for Ubuntu, doca-ofed for Rocky/RHEL)');
-  }
-  
-  const intelNicTags = tags.filter(tag => 
-    tag.toLowerCase().includes('intel') && 
-    (tag.toLowerCase().includes('nic') || tag.toLowerCase().includes('ethernet'))
-  );
-  if (intelNicTags.length > 0) {
-    descriptions.push('Intel NIC driver optimization');
-  }
-  
-  if (tags.some(tag => tag.toLowerCase().includes('broadcom'))) {
-    descriptions.push('Enhanced Broadcom NIC driver support');
+  return descriptions;
+};
+
+// The descriptions keep the order of ENHANCEMENT_DESCRIPTIONS
+const buildEnhancementDescription = (tags) => {
+  const enabled = classifyTags(tags);
+  let mask = 0;
+  for (let index = 0; index < enabled.length; index++) {
+    if (enabled[index]) mask |= 1 << index;
   }
 
-  return descriptions.length > 0 ? descriptions : ['Standard configuration only'];
+  let descriptions = descriptionsByMask.get(mask);
+  if (!descriptions) {
+    const matched = ENHANCEMENT_DESCRIPTIONS.filter((description, index) => enabled[index]);
+    descriptions = matched.length > 0 ? Object.freeze(matched) : STANDARD_CONFIGURATION_ONLY;
+    descriptionsByMask.set(mask, descriptions);
+  }
+  return descriptions;
 };
\ No newline at end of file
@@ -2,35 +2,120 @@ const express = require('express');
 const cors = require('cors');
 const path = require('path');
 const fs = require('fs-extra');
+const crypto = require('crypto');
+const http = require('http');
+const https = require('https');
 const axios = require('axios');
+const { readConfFileAsync } = require('./services/confParser.js');
+const jobStore = require('./services/jobStore.js');
 
 const app = express();
 const PORT = process.env.PORT || 3001;
 
+// Per-request diagnostics are only logged with LOG_LEVEL=debug
+const DEBUG_LOGGING = process.env.LOG_LEVEL === 'debug';
+
 app.use(cors());
 app.use(express.json());
-app.use(express.static(path.join(__dirname, 'client/dist')));
+const CLIENT_DIST_PATH = path.join(__dirname, 'client/dist');
+const INDEX_HTML_PATH = path.join(CLIENT_DIST_PATH, 'index.html');
+
+// Vite fingerprints asset file names, so browsers can keep them for a year without revalidating
+app.use('/assets', express.static(path.join(CLIENT_DIST_PATH, 'assets'), { immutable: true, maxAge: '1y' }));
+// index.html is served from memory by the catch-all route at the end
+app.use(express.static(CLIENT_DIST_PATH, { index: false }));
+
+// Built index.html with its ETag, read once at startup
+let indexHtml = null;
+
+const loadIndexHtml = async () => {
+  try {
+    const body = await fs.readFile(INDEX_HTML_PATH);
+    indexHtml = {
+      body,
+      etag: `"${crypto.createHash('sha1').update(body).digest('base64url')}"`
+    };
+  } catch (error) {
+    console.log('client/dist/index.html not found, the web UI will be unavailable until the client is built');
+  }
+};
 
 let maasConfig = null;
 let userConfig = null;
+let maasClient = null;
+let maasAuthPrefix = null;
+
+// Pools parsed from maas.conf at load time, default to "default" if not specified
+let configuredPools = ['default'];
+let configuredPoolSet = new Set(configuredPools);
+
+// Machine listing filtered by MAAS to the configured pools
+const poolMachinesEndpoint = (pools) =>
+  `machines/?${pools.map(pool => `pool=${encodeURIComponent(pool)}`).join('&')}`;
+let configuredMachinesEndpoint = poolMachinesEndpoint(configuredPools);
+
+// Keep-alive agents shared by every MAAS call so requests reuse pooled TCP/TLS connections.
+// LIFO scheduling hands concurrent calls the most recently used sockets, so bursts
+// fan out over a few warm connections and idle extras expire instead of lingering.
+const maasAgentOptions = {
+  keepAlive: true,
+  maxSockets: 100,
+  maxFreeSockets: 50,
+  scheduling: 'lifo',
+  timeout: 60000
+};
+const maasHttpAgent = new http.Agent(maasAgentOptions);
+const maasHttpsAgent = new https.Agent(maasAgentOptions);
+
+// Create the persistent MAAS API client for the loaded configuration
+const createMaasClient = (config) => axios.create({
+  baseURL: `${config.MAAS_URL}/api/2.0/`,
+  timeout: 30000,
+  httpAgent: maasHttpAgent,
+  httpsAgent: maasHttpsAgent
+});
+
+const MAAS_CONF_PATH = path.join(__dirname, 'maas.conf');
+const USERS_CONF_PATH = path.join(__dirname, 'users.conf');
 
-// Load MAAS configuration
-const loadMaasConfig = () => {
+// Modification times of the loaded config files, so reloads can skip unchanged files
+let maasConfigMtime;
+let userConfigMtime;
+
+// Load MAAS configuration, returns false when onlyIfChanged is set and the file is unchanged
+const loadMaasConfig = async (onlyIfChanged = false) => {
   try {
-    const configPath = path.join(__dirname, 'maas.conf');
-    if (fs.existsSync(configPath)) {
-      const configContent = fs.readFileSync(configPath, 'utf8');
-      const lines = configContent.split('\n');
-      const config = {};
+    const { unchanged, config, mtimeMs } = await readConfFileAsync(
+      MAAS_CONF_PATH,
+      onlyIfChanged ? maasConfigMtime : undefined
+    );
+    if (unchanged) return false;
+    maasConfigMtime = mtimeMs;
+
+    if (config) {
+      maasConfig = config;
+      maasClient = config.MAAS_URL ? createMaasClient(config) : null;
+
+      // Parse the API key parts (consumer_key:consumer_token:secret)
+      const [consumerKey, consumerToken, secret] = (config.API_KEY || '').split(':');
       
-      lines.forEach(line => {
-        const [key, value] = line.split('=').map(s => s.trim());
-        if (key && value) {
-          config[key] = value;
-        }
-      });
+      // MAAS OAuth signature format for PLAINTEXT method
+      const signature = `&${encodeURIComponent(secret)}`;
+
+      // Static part of the OAuth header, only nonce and timestamp change per request
+      maasAuthPrefix = [
+        `OAuth oauth_version="1.0"`,
+        `oauth_signature_method="PLAINTEXT"`,
+        `oauth_consumer_key="${consumerKey}"`,
+        `oauth_token="${consumerToken}"`,
+        `oauth_signature="${signature}"`
+      ].join(', ');
+
+      const pools = config.POOLS ? config.POOLS.split(',').map(p => p.trim()).filter(Boolean) : [];
+      configuredPools = pools.length > 0 ? pools : ['default'];
+      configuredPoolSet = new Set(configuredPools);
+      configuredMachinesEndpoint = poolMachinesEndpoint(configuredPools);
       
-      maasConfig = config;
       console.log('MAAS configuration loaded');
     } else {
       console.log('maas.conf not found. Please create it with MAAS_URL and API_KEY');
@@ -38,24 +123,20 @@ const loadMaasConfig = () => {
   } catch (error) {
     console.error('Error loading MAAS config:', error);
   }
+  return true;
 };
 
-// Load user configuration
-const loadUserConfig = () => {
+// Load user configuration, returns false when onlyIfChanged is set and the file is unchanged
+const loadUserConfig = async (onlyIfChanged = false) => {
   try {
-    const configPath = path.join(__dirname, 'users.conf');
-    if (fs.existsSync(configPath)) {
-      const configContent = fs.readFileSync(configPath, 'utf8');
-      const lines = configContent.split('\n');
-      const config = {};
-      
-      lines.forEach(line => {
-        const [key, value] = line.split('=').map(s => s.trim());
-        if (key && value) {
-          config[key] = value;
-        }
-      });
-      
+    const { unchanged, config, mtimeMs } = await readConfFileAsync(
+      USERS_CONF_PATH,
+      onlyIfChanged ? userConfigMtime : undefined
+    );
+    if (unchanged) return false;
+    userConfigMtime = mtimeMs;
+
+    if (config) {
       userConfig = config;
       console.log('User configuration loaded');
     } else {
@@ -66,64 +147,56 @@ const loadUserConfig = () => {
     console.error('Error loading user config:', error);
     userConfig = null;
   }
+  return true;
 };
 
-// Initialize config on startup
-loadMaasConfig();
-loadUserConfig();
+// Initialize config, saved jobs and the web UI on startup, reading the files concurrently
+const configLoaded = Promise.all([loadMaasConfig(), loadUserConfig(), jobStore.loadJobs(), loadIndexHtml()]);
+
+// URL-encode form fields for a MAAS POST, skipping fields without a value
+const encodeFormData = (data) => {
+  const params = new URLSearchParams();
+  for (const [key, value] of Object.entries(data)) {
+    if (value !== undefined && value !== null) {
+      params.append(key, value);
+    }
+  }
+  return params.toString();
+};
 
 // MAAS API helper
-const maasApi = async (endpoint, method = 'GET', data = null) => {
-  if (!maasConfig || !maasConfig.MAAS_URL || !maasConfig.API_KEY) {
+// responseType 'text' returns the raw JSON body without parsing it
+// POST data may be an object or an already URL-encoded string
+const maasApi = async (endpoint, method = 'GET', data = null, responseType = 'json') => {
+  if (!maasConfig || !maasConfig.MAAS_URL || !maasConfig.API_KEY || !maasClient || !maasAuthPrefix) {
     throw new Error('MAAS configuration not found');
   }
 
-  // Parse the API key parts (consumer_key:consumer_token:secret)
-  const [consumerKey, consumerToken, secret] = maasConfig.API_KEY.split(':');
-  
   // Generate OAuth parameters
-  const timestamp = Math.floor(Date.now() / 1000).toString();
-  const nonce = Math.random().toString(36).substring(2, 15) + Math.random().toString(36).substring(2, 15);
-  
-  // MAAS OAuth signature format for PLAINTEXT method
-  const signature = `&${encodeURIComponent(secret)}`;
-  
-  // Build OAuth authorization header
-  const oauthParams = [
-    `oauth_version="1.0"`,
-    `oauth_signature_method="PLAINTEXT"`,
-    `oauth_consumer_key="${consumerKey}"`,
-    `oauth_token="${consumerToken}"`,
-    `oauth_signature="${signature}"`,
-    `oauth_nonce="${nonce}"`,
-    `oauth_timestamp="${timestamp}"`
-  ];
+  const timestamp = Math.floor(Date.now() / 1000);
+  const nonce = crypto.randomBytes(16).toString('base64url');
   
   const config = {
     method,
-    url: `${maasConfig.MAAS_URL}/api/2.0/${endpoint}`,
+    url: endpoint,
+    responseType,
     headers: {
-      'Authorization': `OAuth ${oauthParams.join(', ')}`,
+      'Authorization': `${maasAuthPrefix}, oauth_nonce="${nonce}", oauth_timestamp="${timestamp}"`,
     }
   };
 
   // For POST requests with form data
   if (data && method === 'POST') {
     config.headers['Content-Type'] = 'application/x-www-form-urlencoded';
-    // Convert data to URL encoded format
-    if (typeof data === 'object') {
-      const params = new URLSearchParams();
-      Object.keys(data).forEach(key => {
-        params.append(key, data[key]);
-      });
-      config.data = params.toString();
-    } else {
-      config.data = data;
-    }
+    config.data = typeof data === 'object' ? encodeFormData(data) : data;
   }
 
   try {
-    const response = await axios(config);
+    const response = await maasClient.request(config);
+    // Writes change MAAS state, so cached reads are no longer valid
+    if (method !== 'GET') {
+      maasCache.clear();
+    }
     return response.data;
   } catch (error) {
     console.error('MAAS API Error:', error.response?.data || error.message);
@@ -131,12 +204,29 @@ const maasApi = async (endpoint, method = 'GET', data = null) => {
   }
 };
 
+// Short-lived cache of read-only MAAS responses so concurrent polls share one fetch
+const MAAS_CACHE_TTL_MS = 3000;
+const maasCache = new Map();
+
+const cachedMaasApi = (endpoint, raw = false) => {
+  const key = raw ? `raw:${endpoint}` : endpoint;
+  const now = Date.now();
+  const cached = maasCache.get(key);
+  if (cached && cached.expiresAt > now) {
+    return cached.promise;
+  }
+
+  const promise = raw ? maasApi(endpoint, 'GET', null, 'text') : maasApi(endpoint);
+  maasCache.set(key, { promise, expiresAt: now + MAAS_CACHE_TTL_MS });
+  // Don't keep serving a failed fetch from the cache
+  promise.catch(() => {
+    if (maasCache.get(key)?.promise === promise) maasCache.delete(key);
+  });
+  return promise;
+};
+
 // API Routes
 app.get('/api/config/status', (req, res) => {
-  const configuredPools = maasConfig?.POOLS ? 
-    maasConfig.POOLS.split(',').map(p => p.trim()) : 
-    ['default'];
-    
   res.json({
     configured: !!maasConfig?.MAAS_URL && !!maasConfig?.API_KEY,
     url: maasConfig?.MAAS_URL || null,
@@ -144,6 +234,23 @@ app.get('/api/config/status', (req, res) => {
   });
 });
 
+// Re-read configuration files that changed on disk since they were last loaded
+app.post('/api/config/reload', async (req, res) => {
+  const [maasReloaded, userReloaded] = await Promise.all([
+    loadMaasConfig(true),
+    loadUserConfig(true)
+  ]);
+  
+  if (maasReloaded) {
+    maasCache.clear();
+  }
+  
+  res.json({
+    maas_config_reloaded: maasReloaded,
+    user_config_reloaded: userReloaded
+  });
+});
+
 app.get('/api/user/config', (req, res) => {
   res.json({
     configured: !!userConfig,
@@ -160,18 +267,16 @@ app.get('/api/config/defaults', async (req, res) => {
     
     try {
       // First try the main MAAS config endpoint
-      config = await maasApi('maas/');
+      config = await cachedMaasApi('maas/');
     } catch (error1) {
       try {
         // Fallback to version endpoint which sometimes contains defaults
-        config = await maasApi('version/');
+        config = await cachedMaasApi('version/');
       } catch (error2) {
         console.log('Both MAAS config endpoints failed, using fallback defaults');
       }
     }
 
-    console.log('MAAS config response:', JSON.stringify(config, null, 2));
-    
     res.json({
       default_distro_series: config.default_distro_series || config.default_series || 'jammy',
       default_min_hwe_kernel: config.default_min_hwe_kernel || config.default_kernel || '',
@@ -192,23 +297,18 @@ app.get('/api/config/defaults', async (req, res) => {
 
 app.get('/api/machines', async (req, res) => {
   try {
-    const machines = await maasApi('machines/');
+    const machines = await cachedMaasApi(configuredMachinesEndpoint);
     
-    // Get configured pools from MAAS config, default to "default" if not specified
-    const configuredPools = maasConfig?.POOLS ? 
-      maasConfig.POOLS.split(',').map(p => p.trim()) : 
-      ['default'];
-    
-    console.log('Configured pools:', configuredPools);
-    
-    // Filter machines by configured pools
+    // Filter machines by configured pools (MAAS already does, this guards older servers)
     const filteredMachines = machines.filter(machine => {
       // If machine has no pool info, assume it's in default pool
       const machinePool = machine.pool?.name || 'default';
-      return configuredPools.includes(machinePool);
+      return configuredPoolSet.has(machinePool);
     });
     
-    console.log(`Filtered ${filteredMachines.length}/${machines.length} machines by pools: ${configuredPools.join(', ')}`);
+    if (DEBUG_LOGGING) {
+      console.log(`Filtered ${filteredMachines.length}/${machines.length} machines by pools: ${configuredPools.join(', ')}`);
+    }
     
     res.json(filteredMachines);
   } catch (error) {
@@ -218,8 +318,8 @@ app.get('/api/machines', async (req, res) => {
 
 app.get('/api/tags', async (req, res) => {
   try {
-    const tags = await maasApi('tags/');
-    res.json(tags);
+    // Pass the MAAS JSON through as-is instead of parsing and re-serializing it
+    res.type('json').send(await cachedMaasApi('tags/', true));
   } catch (error) {
     res.status(500).json({ error: error.message });
   }
@@ -227,8 +327,7 @@ app.get('/api/tags', async (req, res) => {
 
 app.get('/api/pools', async (req, res) => {
   try {
-    const pools = await maasApi('resource-pools/');
-    res.json(pools);
+    res.type('json').send(await cachedMaasApi('resource-pools/', true));
   } catch (error) {
     res.status(500).json({ error: error.message });
   }
@@ -236,8 +335,7 @@ app.get('/api/pools', async (req, res) => {
 
 app.get('/api/boot-sources', async (req, res) => {
   try {
-    const bootSources = await maasApi('boot-sources/');
-    res.json(bootSources);
+    res.type('json').send(await cachedMaasApi('boot-sources/', true));
   } catch (error) {
     res.status(500).json({ error: error.message });
   }
@@ -245,8 +343,7 @@ app.get('/api/boot-sources', async (req, res) => {
 
 app.get('/api/boot-resources', async (req, res) => {
   try {
-    const bootResources = await maasApi('boot-resources/');
-    res.json(bootResources);
+    res.type('json').send(await cachedMaasApi('boot-resources/', true));
   } catch (error) {
     res.status(500).json({ error: error.message });
   }
@@ -301,29 +398,42 @@ app.get('/api/machines/:id/status', async (req, res) => {
   }
 });
 
+// Return the n items with the largest key in descending order, without sorting the whole list.
+// Ties keep their original order, matching a stable sort followed by slice(0, n).
+const topN = (items, n, key) => {
+  const top = [];
+  for (const item of items) {
+    const value = key(item);
+    if (top.length === n && !(value > top[n - 1].value)) continue;
+    
+    let index = top.length;
+    while (index > 0 && top[index - 1].value < value) index--;
+    top.splice(index, 0, { item, value });
+    if (top.length > n) top.pop();
+  }
+  return top.map(entry => entry.item);
+};
+
 // Get recent deployments from all machines (including manual MAAS deployments)
 app.get('/api/deployments/recent', async (req, res) => {
   try {
-    const machines = await maasApi('machines/');
+    const machines = await cachedMaasApi(configuredMachinesEndpoint);
     
-    // Get configured pools from MAAS config, default to "default" if not specified
-    const configuredPools = maasConfig?.POOLS ? 
-      maasConfig.POOLS.split(',').map(p => p.trim()) : 
-      ['default'];
+    // Fallback timestamp for machines without updated/created info
+    const now = new Date().toISOString();
+    const machineTimestamp = machine => machine.updated || machine.created || now;
     
-    // Filter machines by configured pools
-    const filteredMachines = machines.filter(machine => {
+    // Find machines in configured pools that have been deployed recently or are currently deploying
+    const deployedMachines = machines.filter(machine => {
       // If machine has no pool info, assume it's in default pool
       const machinePool = machine.pool?.name || 'default';
-      return configuredPools.includes(machinePool);
+      // Include machines that are deployed, deploying, or failed deployment
+      return configuredPoolSet.has(machinePool) &&
+        ['Deployed', 'Deploying', 'Failed deployment'].includes(machine.status_name);
     });
     
-    // Find machines that have been deployed recently or are currently deploying
-    const recentDeployments = filteredMachines
-      .filter(machine => {
-        // Include machines that are deployed, deploying, or failed deployment
-        return ['Deployed', 'Deploying', 'Failed deployment'].includes(machine.status_name);
-      })
+    // Keep the last 20 deployments (most recent first) and only build records for those
+    const recentDeployments = topN(deployedMachines, 20, machine => Date.parse(machineTimestamp(machine)))
       .map(machine => {
         // Create a deployment record similar to app-initiated ones
         return {
@@ -334,19 +444,17 @@ app.get('/api/deployments/recent', async (req, res) => {
             hostname: machine.hostname,
             status_name: machine.status_name
           },
-          timestamp: machine.updated || machine.created || new Date().toISOString(),
+          timestamp: machineTimestamp(machine),
           source: 'maas', // Indicate this came from MAAS directly
           status_name: machine.status_name,
           status_message: machine.status_message,
           pool: machine.pool?.name || 'default'
         };
-      })
-      // Sort by timestamp (most recent first)
-      .sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp))
-      // Limit to last 20 deployments
-      .slice(0, 20);
+      });
     
-    console.log(`Found ${recentDeployments.length} recent deployments in pools: ${configuredPools.join(', ')}`);
+    if (DEBUG_LOGGING) {
+      console.log(`Found ${recentDeployments.length} recent deployments in pools: ${configuredPools.join(', ')}`);
+    }
     
     res.json(recentDeployments);
   } catch (error) {
@@ -355,8 +463,80 @@ app.get('/api/deployments/recent', async (req, res) => {
   }
 });
 
-// In-memory storage for provisioning jobs (in production, use Redis or database)
-const provisioningJobs = new Map();
+// Per-machine fields used by auto-selection, cached per machine list
+// Auto-selection reads the list through cachedMaasApi, so requests within the cache TTL share one index
+// Tags are numbered per list and each machine's tags stored as a bitmask, `words` Uint32
+// values per machine in tagMasks, so tag matching is a few integer ANDs per machine
+const machineIndexCache = new WeakMap();
+
+const getMachineIndex = (machines) => {
+  let index = machineIndexCache.get(machines);
+  if (index) return index;
+
+  const tagBits = new Map();
+  for (const machine of machines) {
+    for (const tag of machine.tag_names || []) {
+      if (!tagBits.has(tag)) tagBits.set(tag, tagBits.size);
+    }
+  }
+
+  const words = Math.max(1, Math.ceil(tagBits.size / 32));
+  const ready = new Uint8Array(machines.length);
+  const pools = new Array(machines.length);
+  const tagMasks = new Uint32Array(machines.length * words);
+
+  machines.forEach((machine, i) => {
+    ready[i] = machine.status_name === 'Ready' ? 1 : 0;
+    // If machine has no pool info, assume it's in default pool
+    pools[i] = machine.pool?.name || 'default';
+    for (const tag of machine.tag_names || []) {
+      const bit = tagBits.get(tag);
+      tagMasks[i * words + (bit >>> 5)] |= 1 << (bit & 31);
+    }
+  });
+
+  index = { ready, pools, tagBits, words, tagMasks };
+  machineIndexCache.set(machines, index);
+  return index;
+};
+
+// Bitmask of the given tags in an index, plus whether any tag is carried by no machine at all
+const getTagMask = (index, tags) => {
+  const mask = new Uint32Array(index.words);
+  let hasUnknownTag = false;
+  for (const tag of tags) {
+    const bit = index.tagBits.get(tag);
+    if (bit === undefined) {
+      hasUnknownTag = true;
+    } else {
+      mask[bit >>> 5] |= 1 << (bit & 31);
+    }
+  }
+  return { mask, hasUnknownTag };
+};
+
+// Whether machine i has every tag in mask
+const hasAllTags = (index, i, mask) => {
+  const offset = i * index.words;
+  for (let word = 0; word < index.words; word++) {
+    if (mask[word] & ~index.tagMasks[offset + word]) return false;
+  }
+  return true;
+};
+
+// Whether machine i has at least one tag in mask
+const hasAnyTag = (index, i, mask) => {
+  const offset = i * index.words;
+  for (let word = 0; word < index.words; word++) {
+    if (mask[word] & index.tagMasks[offset + word]) return true;
+  }
+  return false;
+};
+
+// Provisioning jobs are kept in services/jobStore.js
+// Job IDs carry a random per-process segment, so IDs stay unique across restarts
+// even though the counter starts again from 1
+const jobIdInstance = crypto.randomBytes(2).toString('hex');
 let jobIdCounter = 1;
 
 // API endpoint for batch machine provisioning
@@ -417,88 +597,12 @@ app.post('/api/provision', async (req, res) => {
     let resourceValidation = null;
     
     if (auto_select || (tags && tags.length > 0 && !machines)) {
+      // Get the machines in the configured pools, through the TTL cache so the index is reused
+      // The cached list is only used to choose candidates, the deployment re-reads their current state
+      // The cached list and its machines are shared between requests and must not be modified
+      let allMachines;
       try {
-        // Get all available machines
-        const allMachines = await maasApi('machines/');
-        
-        // Filter machines by configured pools
-        const configuredPools = maasConfig?.POOLS ? 
-          maasConfig.POOLS.split(',').map(p => p.trim()) : 
-          ['default'];
-        
-        const poolFilteredMachines = allMachines.filter(machine => {
-          const machinePool = machine.pool?.name || 'default';
-          return configuredPools.includes(machinePool);
-        });
-        
-        // Filter by additional pool if specified in request
-        let availableMachines = pool ? 
-          poolFilteredMachines.filter(machine => (machine.pool?.name || 'default') === pool) :
-          poolFilteredMachines;
-        
-        // Filter by tags based on match mode
-        const matchMode = tag_match_mode || 'all'; // default to 'all'
-        const taggedMachines = availableMachines.filter(machine => {
-          const machineTags = machine.tag_names || [];
-          
-          if (matchMode === 'any') {
-            // Machine must have AT LEAST ONE of the specified tags
-            return tags.some(tag => machineTags.includes(tag));
-          } else {
-            // Machine must have ALL specified tags (default behavior)
-            return tags.every(tag => machineTags.includes(tag));
-          }
-        });
-        
-        // Filter by Ready status
-        const readyMachines = taggedMachines.filter(machine => 
-          machine.status_name === 'Ready'
-        );
-        
-        console.log(`Auto-selection: Found ${readyMachines.length} ready machines with tags [${tags.join(', ')}] (${matchMode} match), need ${count}`);
-        
-        // Check if we have enough resources
-        if (readyMachines.length < count) {
-          const availableCount = readyMachines.length;
-          const requestedTags = tags.join(', ');
-          const poolInfo = pool ? ` in pool '${pool}'` : '';
-          
-          return res.status(409).json({ 
-            error: 'Not enough resources to provision',
-            details: {
-              requested_count: count,
-              available_count: availableCount,
-              required_tags: tags,
-              pool: pool || 'any configured pool',
-              message: `Requested ${count} machines with tags [${requestedTags}]${poolInfo}, but only ${availableCount} ready machines available`
-            },
-            available_machines: readyMachines.map(m => ({
-              system_id: m.system_id,
-              hostname: m.hostname || m.system_id,
-              tags: m.tag_names || [],
-              pool: m.pool?.name || 'default'
-            }))
-          });
-        }
-        
-        // Select the requested number of machines
-        selectedMachines = readyMachines.slice(0, count).map(m => m.system_id);
-        
-        resourceValidation = {
-          auto_selected: true,
-          requested_count: count,
-          available_count: readyMachines.length,
-          selected_machines: selectedMachines.length,
-          selection_criteria: {
-            tags,
-            tag_match_mode: matchMode,
-            pool,
-            status: 'Ready'
-          }
-        };
-        
-        console.log(`Auto-selected ${selectedMachines.length} machines:`, selectedMachines);
-        
+        allMachines = await cachedMaasApi(configuredMachinesEndpoint);
       } catch (error) {
         console.error('Auto-selection error:', error);
         return res.status(500).json({ 
@@ -506,22 +610,101 @@ app.post('/api/provision', async (req, res) => {
           details: error.message
         });
       }
+      
+      // Filter by configured pools, requested pool, Ready status and tags in a single pass
+      const matchMode = tag_match_mode || 'all'; // default to 'all'
+      const index = getMachineIndex(allMachines);
+      const { mask: requestedTags, hasUnknownTag } = getTagMask(index, tags);
+      const isSelectable = (i) => {
+        if (!index.ready[i]) return false;
+        const machinePool = index.pools[i];
+        if (!configuredPoolSet.has(machinePool) || (pool && machinePool !== pool)) return false;
+        
+        if (matchMode === 'any') {
+          // Machine must have AT LEAST ONE of the specified tags
+          return hasAnyTag(index, i, requestedTags);
+        }
+        // Machine must have ALL specified tags (default behavior)
+        return hasAllTags(index, i, requestedTags);
+      };
+      
+      // Only the first count matches are collected, the rest are just counted for available_count.
+      // In 'all' mode a tag no machine carries rules out every machine, so there is nothing to scan
+      const readyMachines = [];
+      let availableCount = 0;
+      if (matchMode === 'any' || !hasUnknownTag) {
+        for (let i = 0; i < allMachines.length; i++) {
+          if (!isSelectable(i)) continue;
+          if (availableCount++ < count) readyMachines.push(allMachines[i]);
+        }
+      }
+      
+      console.log(`Auto-selection: Found ${availableCount} ready machines with tags [${tags.join(', ')}] (${matchMode} match), need ${count}`);
+      
+      // Check if we have enough resources
+      if (readyMachines.length < count) {
+        const requestedTags = tags.join(', ');
+        const poolInfo = pool ? ` in pool '${pool}'` : '';
+        
+        return res.status(409).json({ 
+          error: 'Not enough resources to provision',
+          details: {
+            requested_count: count,
+            available_count: availableCount,
+            required_tags: tags,
+            pool: pool || 'any configured pool',
+            message: `Requested ${count} machines with tags [${requestedTags}]${poolInfo}, but only ${availableCount} ready machines available`
+          },
+          available_machines: readyMachines.map(m => ({
+            system_id: m.system_id,
+            hostname: m.hostname || m.system_id,
+            tags: m.tag_names || [],
+            pool: m.pool?.name || 'default'
+          }))
+        });
+      }
+      
+      // Select the requested number of machines
+      selectedMachines = readyMachines.slice(0, count).map(m => m.system_id);
+      
+      resourceValidation = {
+        auto_selected: true,
+        requested_count: count,
+        available_count: availableCount,
+        selected_machines: selectedMachines.length,
+        selection_criteria: {
+          tags,
+          tag_match_mode: matchMode,
+          pool,
+          status: 'Ready'
+        }
+      };
+      
+      if (DEBUG_LOGGING) {
+        console.log(`Auto-selected ${selectedMachines.length} machines:`, selectedMachines);
+      }
     }
 
-    // Create provisioning job
-    const jobId = `job-${Date.now()}-${jobIdCounter++}`;
+    // Create provisioning job, the ID and both timestamps share one clock reading
+    const createdAt = Date.now();
+    const createdAtIso = new Date(createdAt).toISOString();
+    const jobId = `job-${createdAt}-${jobIdInstance}-${jobIdCounter++}`;
+    // Every field is present from the start (completed_at and error stay null until set),
+    // so all jobs share one object shape instead of growing new properties mid-deployment
     const job = {
       id: jobId,
       status: 'pending',
-      created_at: new Date().toISOString(),
-      updated_at: new Date().toISOString(),
+      created_at: createdAtIso,
+      updated_at: createdAtIso,
+      completed_at: null,
+      error: null,
       machines: [],
       total_machines: 0,
       successful_deployments: 0,
       failed_deployments: 0,
       results: [],
       resource_validation: resourceValidation,
-      config: {
+      config: Object.freeze({
         distro_series: distro_series || 'jammy',
         user_data,
         tags,
@@ -529,19 +712,19 @@ app.post('/api/provision', async (req, res) => {
         count,
         auto_select,
         tag_match_mode
-      }
+      })
     };
 
-    provisioningJobs.set(jobId, job);
+    jobStore.addJob(job);
 
-    // Start deployment process asynchronously
-    setImmediate(() => deployMachines(jobId, selectedMachines, job.config));
+    // Queue the deployment, it starts as soon as a job slot is free
+    enqueueDeployment(jobId, selectedMachines, job.config);
 
     // Return job ID immediately
     const response = {
       job_id: jobId,
       status: 'pending',
-      message: 'Provisioning job started. Use GET /api/provision/:job_id to track progress.',
+      message: 'Provisioning job started. Use GET /api/provision/:job_id to track progress or GET /api/provision/:job_id/events for live updates.',
       machines_to_deploy: selectedMachines.length
     };
     
@@ -562,54 +745,216 @@ app.post('/api/provision', async (req, res) => {
 // Get provisioning job status
 app.get('/api/provision/:jobId', (req, res) => {
   const { jobId } = req.params;
-  const job = provisioningJobs.get(jobId);
+  const job = jobStore.getJob(jobId);
 
   if (!job) {
     return res.status(404).json({ error: 'Provisioning job not found' });
   }
 
-  res.json(job);
+  // Finished jobs no longer change, so clients may keep them; running jobs are revalidated
+  // with the ETag, and res.send answers 304 when it still matches
+  res.set({
+    'ETag': jobStore.getJobEtag(job),
+    'Cache-Control': jobStore.isActiveJob(job) ? 'no-cache' : 'private, max-age=31536000, immutable'
+  });
+  res.type('json').send(jobStore.getJobJson(job));
 });
 
-// List all provisioning jobs
-app.get('/api/provision', (req, res) => {
-  const { status, limit = 50 } = req.query;
-  let jobs = Array.from(provisioningJobs.values());
+// Get the per-machine results of a provisioning job
+app.get('/api/provision/:jobId/results', (req, res) => {
+  const { jobId } = req.params;
+  const job = jobStore.getJob(jobId);
+
+  if (!job) {
+    return res.status(404).json({ error: 'Provisioning job not found' });
+  }
+
+  res.json({
+    job_id: job.id,
+    status: job.status,
+    results: job.results
+  });
+});
+
+// Close functions of open live update streams, called on shutdown so the server can close
+const jobEventStreams = new Set();
+const JOB_EVENTS_HEARTBEAT_MS = 30000;
+
+// Stream provisioning job updates as server-sent events instead of polling the job
+// The current job is sent right away, then again on every change until the job finishes,
+// which is followed by a 'done' event carrying the final status
+app.get('/api/provision/:jobId/events', (req, res) => {
+  const { jobId } = req.params;
+  const job = jobStore.getJob(jobId);
+
+  if (!job) {
+    return res.status(404).json({ error: 'Provisioning job not found' });
+  }
 
-  // Filter by status if provided
-  if (status) {
-    jobs = jobs.filter(job => job.status === status);
+  // EventSource reconnects whenever a stream ends, but not after a 204, so a finished job
+  // (including one that finished while the client was reconnecting) gets no stream at all
+  if (!jobStore.isActiveJob(job)) {
+    return res.status(204).end();
   }
 
-  // Sort by created_at desc and limit
-  jobs = jobs
-    .sort((a, b) => new Date(b.created_at) - new Date(a.created_at))
-    .slice(0, parseInt(limit));
+  res.set({
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive'
+  });
+  res.flushHeaders();
+
+  res.write(`data: ${jobStore.getJobJson(job)}\n\n`);
+
+  const sendJob = (updatedJob) => {
+    res.write(`data: ${jobStore.getJobJson(updatedJob)}\n\n`);
+    if (!jobStore.isActiveJob(updatedJob)) {
+      // Tells the client to close the stream rather than reconnect
+      res.write(`event: done\ndata: ${updatedJob.status}\n\n`);
+      closeStream();
+    }
+  };
+
+  // Comment lines keep proxies from closing an idle stream while machines deploy
+  const heartbeat = setInterval(() => res.write(': heartbeat\n\n'), JOB_EVENTS_HEARTBEAT_MS);
+
+  const closeStream = () => {
+    clearInterval(heartbeat);
+    jobStore.jobEvents.off(jobId, sendJob);
+    jobEventStreams.delete(closeStream);
+    if (!res.writableEnded) res.end();
+  };
+
+  jobStore.jobEvents.on(jobId, sendJob);
+  jobEventStreams.add(closeStream);
+  res.on('close', closeStream);
+});
+
+// List all provisioning jobs, newest first, as summaries without per-machine details
+app.get('/api/provision', (req, res) => {
+  const { status, limit = 50 } = req.query;
+  const jobs = jobStore.listJobs({ status, limit: parseInt(limit) });
 
   res.json({
-    jobs,
-    total: provisioningJobs.size
+    jobs: jobs.map(jobStore.summarizeJob),
+    total: jobStore.countJobs()
   });
 });
 
+// Maximum number of provisioning jobs deploying at the same time, further jobs wait in order
+const MAX_CONCURRENT_JOBS = parseInt(process.env.MAX_CONCURRENT_JOBS, 10) || 4;
+const deploymentQueue = [];
+let runningDeployments = 0;
+
+// Start queued deployments while job slots are free
+const runQueuedDeployments = () => {
+  while (runningDeployments < MAX_CONCURRENT_JOBS && deploymentQueue.length > 0) {
+    const { jobId, machineIds, config } = deploymentQueue.shift();
+    runningDeployments++;
+    deployMachines(jobId, machineIds, config).finally(() => {
+      runningDeployments--;
+      runQueuedDeployments();
+    });
+  }
+};
+
+// Add a deployment to the queue
+const enqueueDeployment = (jobId, machineIds, config) => {
+  deploymentQueue.push({ jobId, machineIds, config });
+  setImmediate(runQueuedDeployments);
+};
+
+// Maximum number of machines deployed concurrently within a job
+const DEPLOY_CONCURRENCY = 16;
+
+// Maximum number of MAAS deploy calls in flight across all running jobs
+const MAX_PARALLEL_DEPLOYS = parseInt(process.env.MAX_PARALLEL_DEPLOYS, 10) || 16;
+const deploySlotWaiters = [];
+let activeDeploys = 0;
+
+// Run fn once a deploy slot is free, waiting callers get slots in the order they asked
+const withDeploySlot = async (fn) => {
+  if (activeDeploys < MAX_PARALLEL_DEPLOYS) {
+    activeDeploys++;
+  } else {
+    await new Promise(resolve => deploySlotWaiters.push(resolve));
+  }
+
+  try {
+    return await fn();
+  } finally {
+    // Hand the slot straight to the next waiter, or release it
+    const next = deploySlotWaiters.shift();
+    if (next) {
+      next();
+    } else {
+      activeDeploys--;
+    }
+  }
+};
+
+// Fields of the machine returned by a MAAS deploy call that are kept in job results
+// The full machine object is tens of KB and would be stored, persisted and served with every job
+const summarizeDeployResult = (result) => ({
+  system_id: result?.system_id,
+  hostname: result?.hostname,
+  fqdn: result?.fqdn,
+  status_name: result?.status_name,
+  osystem: result?.osystem,
+  distro_series: result?.distro_series
+});
+
+// Run an async worker over items with at most `limit` calls in flight
+const mapWithConcurrency = async (items, limit, worker) => {
+  const results = new Array(items.length);
+  let nextIndex = 0;
+
+  const runners = Array.from({ length: Math.min(limit, items.length) }, async () => {
+    while (nextIndex < items.length) {
+      const index = nextIndex++;
+      results[index] = await worker(items[index], index);
+    }
+  });
+
+  await Promise.all(runners);
+  return results;
+};
+
 // Async function to handle machine deployments
+// Machine state is read fresh from MAAS when the job starts, so the Ready check is current
 const deployMachines = async (jobId, machineIds, config) => {
-  const { getMachineCloudInit } = require('./services/cloudInitGenerator.js');
-  const job = provisioningJobs.get(jobId);
+  const { createCloudInitContext, getMachineCloudInit } = require('./services/cloudInitGenerator.js');
+  const job = jobStore.getJob(jobId);
   if (!job) return;
 
   try {
-    job.status = 'running';
+    jobStore.setJobStatus(job, 'running');
     job.updated_at = new Date().toISOString();
+    jobStore.publishJob(job);
     
-    // Get current machines data for processing
-    const allMachines = await maasApi('machines/');
-    let targetMachines = [];
+    const systemIds = machineIds.map(machineInput =>
+      typeof machineInput === 'string' ? machineInput : machineInput.system_id
+    );
+
+    // Get current data for just the requested machines
+    const allMachines = await maasApi(
+      `machines/?${systemIds.map(id => `id=${encodeURIComponent(id)}`).join('&')}`
+    );
+
+    // Only index the requested machines, stopping once all of them are found
+    const requestedIds = new Set(systemIds);
+    const machinesById = new Map();
+    for (const machine of allMachines) {
+      if (requestedIds.has(machine.system_id)) {
+        machinesById.set(machine.system_id, machine);
+        if (machinesById.size === requestedIds.size) break;
+      }
+    }
 
     // Resolve machine IDs to machine objects
-    for (const machineInput of machineIds) {
-      const systemId = typeof machineInput === 'string' ? machineInput : machineInput.system_id;
-      const machine = allMachines.find(m => m.system_id === systemId);
+    let targetMachines = [];
+    for (const systemId of systemIds) {
+      const machine = machinesById.get(systemId);
       
       if (machine) {
         // Check if machine is in Ready state
@@ -633,16 +978,12 @@ const deployMachines = async (jobId, machineIds, config) => {
       }
     }
 
-    // Apply additional filters if specified
-    if (config.tags && config.tags.length > 0) {
-      targetMachines = targetMachines.filter(machine => 
-        config.tags.some(tag => machine.tag_names?.includes(tag))
-      );
-    }
-
-    if (config.pool) {
+    // Apply additional tag and pool filters if specified, in a single pass
+    const tagSet = config.tags && config.tags.length > 0 ? new Set(config.tags) : null;
+    if (tagSet || config.pool) {
       targetMachines = targetMachines.filter(machine => 
-        (machine.pool?.name || 'default') === config.pool
+        (!tagSet || (machine.tag_names || []).some(tag => tagSet.has(tag))) &&
+        (!config.pool || (machine.pool?.name || 'default') === config.pool)
       );
     }
 
@@ -656,31 +997,34 @@ const deployMachines = async (jobId, machineIds, config) => {
       system_id: m.system_id,
       hostname: m.hostname || m.fqdn || m.system_id
     }));
+    jobStore.publishJob(job);
 
-    // Deploy each machine
-    for (const machine of targetMachines) {
-      try {
-        // Determine OS type
-        const osType = config.distro_series?.toLowerCase().includes('rocky') || 
-                      config.distro_series?.toLowerCase().includes('rhel') || 
-                      config.distro_series?.toLowerCase().includes('centos') ? 'rocky' : 'ubuntu';
+    // Determine OS type
+    const osType = config.distro_series?.toLowerCase().includes('rocky') || 
+                  config.distro_series?.toLowerCase().includes('rhel') || 
+                  config.distro_series?.toLowerCase().includes('centos') ? 'rocky' : 'ubuntu';
 
-        // Generate machine-specific cloud-init if user_data provided
-        let machineUserData = config.user_data;
-        if (config.user_data) {
-          machineUserData = await getMachineCloudInit(machine, config.user_data, osType);
-        }
+    // Without user_data every machine gets the same deploy request, so encode it once
+    const sharedDeployBody = config.user_data
+      ? null
+      : encodeFormData({ op: 'deploy', distro_series: config.distro_series });
+    // Credentials, base config and custom commands are the same for every machine in the job
+    const cloudInitContext = config.user_data
+      ? createCloudInitContext(config.user_data, osType)
+      : null;
 
-        const deployData = {
-          distro_series: config.distro_series,
-          user_data: machineUserData
-        };
-
-        const result = await maasApi(`machines/${machine.system_id}/`, 'POST', { 
+    // Deploy machines in parallel, bounded so a large batch doesn't flood MAAS
+    await mapWithConcurrency(targetMachines, DEPLOY_CONCURRENCY, async (machine) => {
+      try {
+        // Generate machine-specific cloud-init if user_data provided
+        const deployBody = sharedDeployBody || encodeFormData({
           op: 'deploy',
-          ...deployData 
+          distro_series: config.distro_series,
+          user_data: getMachineCloudInit(machine, config.user_data, osType, cloudInitContext)
         });
 
+        const result = await withDeploySlot(() => maasApi(`machines/${machine.system_id}/`, 'POST', deployBody));
+
         job.results.push({
           machine_id: machine.system_id,
           hostname: machine.hostname || machine.fqdn || machine.system_id,
@@ -688,10 +1032,11 @@ const deployMachines = async (jobId, machineIds, config) => {
           distro_series: config.distro_series,
           os_type: osType,
           deployed_at: new Date().toISOString(),
-          maas_result: result
+          maas_result: summarizeDeployResult(result)
         });
         
         job.successful_deployments++;
+        jobStore.publishJob(job);
 
       } catch (deployError) {
         console.error(`Deployment failed for machine ${machine.system_id}:`, deployError);
@@ -703,28 +1048,79 @@ const deployMachines = async (jobId, machineIds, config) => {
         });
         
         job.failed_deployments++;
+        jobStore.publishJob(job);
       }
-    }
+    });
 
     // Mark job as completed
-    job.status = job.failed_deployments === 0 ? 'completed' : 'completed_with_errors';
-    job.completed_at = new Date().toISOString();
-    job.updated_at = new Date().toISOString();
+    job.completed_at = job.updated_at = new Date().toISOString();
+    jobStore.setJobStatus(job, job.failed_deployments === 0 ? 'completed' : 'completed_with_errors');
 
     console.log(`Provisioning job ${jobId} completed: ${job.successful_deployments} successful, ${job.failed_deployments} failed`);
 
   } catch (error) {
     console.error(`Provisioning job ${jobId} failed:`, error);
-    job.status = 'failed';
     job.error = error.message;
     job.updated_at = new Date().toISOString();
+    jobStore.setJobStatus(job, 'failed');
   }
+
+  jobStore.publishJob(job);
+  jobStore.persistJobs();
 };
 
+// Unknown API paths get a JSON 404 instead of falling through to the web UI
+app.use('/api', (req, res) => {
+  res.status(404).json({ error: `API endpoint not found: ${req.method} ${req.originalUrl}` });
+});
+
 app.get('*', (req, res) => {
-  res.sendFile(path.join(__dirname, 'client/dist/index.html'));
+  if (!indexHtml) {
+    return res.sendFile(INDEX_HTML_PATH);
+  }
+
+  // Browsers revalidate on every navigation, res.send answers 304 when the ETag still matches
+  res.set({ 'Cache-Control': 'no-cache', 'ETag': indexHtml.etag });
+  res.type('html').send(indexHtml.body);
+});
+
+let server = null;
+
+// Start accepting requests once the configuration files have been read
+configLoaded.then(() => {
+  server = app.listen(PORT, '0.0.0.0', () => {
+    console.log(`Server running on http://0.0.0.0:${PORT}`);
+  });
+  // Keep idle client connections open longer than the 5s default so polling browsers and
+  // reverse proxies (which typically idle out at 60s) reuse them instead of reconnecting;
+  // headersTimeout must exceed keepAliveTimeout or reused sockets can be cut mid-request
+  server.keepAliveTimeout = 65000;
+  server.headersTimeout = 66000;
 });
 
-app.listen(PORT, '0.0.0.0', () => {
-  console.log(`Server running on http://0.0.0.0:${PORT}`);
-});
\ No newline at end of file
+// Requests still in progress this long after shutdown starts are cut off, well within
+// Docker's default 10s stop timeout so pending job changes are still saved
+const SHUTDOWN_GRACE_MS = 5000;
+
+// Close the HTTP server, save pending job changes and release pooled MAAS connections on shutdown
+const shutdown = (signal) => {
+  console.log(`${signal} received, shutting down`);
+  if (!server) {
+    process.exit(0);
+  }
+  for (const closeStream of jobEventStreams) {
+    closeStream();
+  }
+  server.close(async () => {
+    await jobStore.flushJobs();
+    maasHttpAgent.destroy();
+    maasHttpsAgent.destroy();
+    process.exit(0);
+  });
+  // server.close() waits for idle keep-alive sockets on Node 18, which stay open for keepAliveTimeout
+  server.closeIdleConnections();
+  setTimeout(() => server.closeAllConnections(), SHUTDOWN_GRACE_MS).unref();
+};
+
+process.on('SIGTERM', () => shutdown('SIGTERM'));
+process.on('SIGINT', () => shutdown('SIGINT'));
\ No newline at end of file
@@ -1,6 +1,15 @@
 // Server-side cloud-init configuration generator
-const fs = require('fs-extra');
 const path = require('path');
+const { readConfFile } = require('./confParser.js');
+
+// js-yaml is loaded when the first config is generated, not when this module is required
+let yaml = null;
+const getYaml = () => {
+  if (!yaml) {
+    yaml = require('js-yaml');
+  }
+  return yaml;
+};
 
 /**
  * Generate base cloud-init configuration with common settings
@@ -10,6 +19,7 @@ const generateBaseCloudInit = (osType = 'ubuntu', userCredentials = null) => {
   const isRocky = osType.toLowerCase().includes('rocky') || 
                   osType.toLowerCase().includes('rhel') || 
                   osType.toLowerCase().includes('centos');
+  const startedAt = new Date().toISOString();
   
   const config = {
     // OS-specific packages
@@ -53,7 +63,7 @@ const generateBaseCloudInit = (osType = 'ubuntu', userCredentials = null) => {
     write_files: [
       {
         path: '/var/log/maas-deployment.log',
-        content: `MAAS deployment started at ${new Date().toISOString()}\n`,
+        content: `MAAS deployment started at ${startedAt}\n`,
         owner: 'root:root',
         permissions: '0644'
       }
@@ -64,7 +74,7 @@ const generateBaseCloudInit = (osType = 'ubuntu', userCredentials = null) => {
       // Create deployment log
       'echo "=== MAAS Cloud-Init Deployment ===" | tee -a /var/log/maas-deployment.log',
       `echo "OS Type: ${osType}" | tee -a /var/log/maas-deployment.log`,
-      `echo "Deployment Time: ${new Date().toISOString()}" | tee -a /var/log/maas-deployment.log`,
+      `echo "Deployment Time: ${startedAt}" | tee -a /var/log/maas-deployment.log`,
       'echo "=== System Information ===" | tee -a /var/log/maas-deployment.log',
       'uname -a | tee -a /var/log/maas-deployment.log',
       'df -h | tee -a /var/log/maas-deployment.log',
@@ -113,6 +123,7 @@ const generateBaseCloudInit = (osType = 'ubuntu', userCredentials = null) => {
  */
 const generateMachineEnhancements = (machine) => {
   const tags = machine.tag_names || [];
+  const tagSet = new Set(tags);
   const enhancements = {
     packages: [],
     runcmd: [],
@@ -130,7 +141,7 @@ const generateMachineEnhancements = (machine) => {
   );
 
   // Network card specific configurations
-  if (tags.includes('bcm57508')) {
+  if (tagSet.has('bcm57508')) {
     enhancements.packages.push('ethtool');
     enhancements.runcmd.push(
       'echo "=== Broadcom BCM57508 Configuration ===" | tee -a /var/log/cloud-init-userdata.log',
@@ -140,7 +151,7 @@ const generateMachineEnhancements = (machine) => {
   }
 
   // AMD64 architecture optimizations
-  if (tags.includes('amd64-arch')) {
+  if (tagSet.has('amd64-arch')) {
     enhancements.packages.push('amd64-microcode');
     enhancements.runcmd.push(
       'echo "=== AMD64 Architecture Optimizations ===" | tee -a /var/log/cloud-init-userdata.log',
@@ -149,7 +160,7 @@ const generateMachineEnhancements = (machine) => {
   }
 
   // Virtual machine specific settings
-  if (tags.includes('virtual')) {
+  if (tagSet.has('virtual')) {
     enhancements.packages.push('qemu-guest-agent');
     enhancements.runcmd.push(
       'echo "=== Virtual Machine Configuration ===" | tee -a /var/log/cloud-init-userdata.log',
@@ -163,40 +174,65 @@ const generateMachineEnhancements = (machine) => {
 };
 
 /**
- * Main function to generate complete cloud-init configuration for a machine
+ * Load user credentials from users.conf, returns null when not configured
  */
-const getMachineCloudInit = async (machine, customUserData = '', osType = 'ubuntu') => {
+const loadUserCredentials = () => {
   try {
-    // Load user credentials
-    let userCredentials = null;
-    try {
-      const userConfigPath = path.join(__dirname, '..', 'users.conf');
-      if (fs.existsSync(userConfigPath)) {
-        const configContent = fs.readFileSync(userConfigPath, 'utf8');
-        const lines = configContent.split('\n');
-        const config = {};
-        
-        lines.forEach(line => {
-          const [key, value] = line.split('=').map(s => s.trim());
-          if (key && value) {
-            config[key] = value;
-          }
-        });
-        
-        if (config.USERNAME && config.PASSWORD) {
-          userCredentials = {
-            configured: true,
-            username: config.USERNAME,
-            password: config.PASSWORD
-          };
-        }
-      }
-    } catch (error) {
-      console.log('Could not load user credentials, proceeding without user creation');
+    const config = readConfFile(path.join(__dirname, '..', 'users.conf'));
+    if (config?.USERNAME && config?.PASSWORD) {
+      return {
+        configured: true,
+        username: config.USERNAME,
+        password: config.PASSWORD
+      };
     }
+  } catch (error) {
+    console.log('Could not load user credentials, proceeding without user creation');
+  }
+  return null;
+};
+
+/**
+ * Convert custom user data into the runcmd entries appended after the generated config
+ */
+const generateCustomRuncmd = (customUserData) => {
+  if (!customUserData || !customUserData.trim()) {
+    return [];
+  }
+
+  const runcmd = [
+    'echo "=== Custom User Data Execution ===" | tee -a /var/log/maas-deployment.log'
+  ];
+
+  // If it's already cloud-config YAML, it is applied by cloud-init directly
+  if (customUserData.includes('runcmd:') || customUserData.includes('packages:')) {
+    runcmd.push(
+      'echo "Custom cloud-config provided - see cloud-init logs for details" | tee -a /var/log/maas-deployment.log'
+    );
+  } else {
+    // Treat as shell commands
+    runcmd.push(...customUserData.split('\n').filter(line => line.trim()));
+  }
+
+  return runcmd;
+};
 
-    // Generate base configuration
-    const baseConfig = generateBaseCloudInit(osType, userCredentials);
+/**
+ * Build the machine-independent parts of a deployment once so every machine in a job can share them
+ */
+const createCloudInitContext = (customUserData = '', osType = 'ubuntu') => ({
+  baseConfig: generateBaseCloudInit(osType, loadUserCredentials()),
+  customRuncmd: generateCustomRuncmd(customUserData)
+});
+
+/**
+ * Main function to generate complete cloud-init configuration for a machine
+ * Pass a context from createCloudInitContext to reuse credentials and the base config across a job
+ * Generation is synchronous, there is nothing to wait for
+ */
+const getMachineCloudInit = (machine, customUserData = '', osType = 'ubuntu', context = null) => {
+  try {
+    const { baseConfig, customRuncmd } = context || createCloudInitContext(customUserData, osType);
     
     // Generate machine-specific enhancements
     const enhancements = generateMachineEnhancements(machine);
@@ -205,40 +241,12 @@ const getMachineCloudInit = async (machine, customUserData = '', osType = 'ubunt
     const finalConfig = {
       ...baseConfig,
       packages: [...baseConfig.packages, ...enhancements.packages],
-      runcmd: [...baseConfig.runcmd, ...enhancements.runcmd],
+      runcmd: [...baseConfig.runcmd, ...enhancements.runcmd, ...customRuncmd],
       write_files: [...baseConfig.write_files, ...enhancements.write_files]
     };
     
-    // Add custom user data if provided
-    if (customUserData && customUserData.trim()) {
-      finalConfig.runcmd.push(
-        'echo "=== Custom User Data Execution ===" | tee -a /var/log/maas-deployment.log'
-      );
-      
-      // Parse and add custom user data
-      try {
-        const customConfig = customUserData.startsWith('#cloud-config') 
-          ? customUserData 
-          : `#cloud-config\n${customUserData}`;
-        
-        // If it's already cloud-config YAML, try to parse and merge
-        if (customUserData.includes('runcmd:') || customUserData.includes('packages:')) {
-          finalConfig.runcmd.push(
-            'echo "Custom cloud-config provided - see cloud-init logs for details" | tee -a /var/log/maas-deployment.log'
-          );
-        } else {
-          // Treat as shell commands
-          const customCommands = customUserData.split('\n').filter(line => line.trim());
-          finalConfig.runcmd.push(...customCommands);
-        }
-      } catch (error) {
-        console.warn('Error processing custom user data:', error);
-      }
-    }
-    
     // Convert to YAML string
-    const yaml = require('js-yaml');
-    const cloudInitYaml = `#cloud-config\n${yaml.dump(finalConfig, { 
+    const cloudInitYaml = `#cloud-config\n${getYaml().dump(finalConfig, { 
       indent: 2,
       lineWidth: -1,
       noRefs: true
@@ -255,5 +263,6 @@ const getMachineCloudInit = async (machine, customUserData = '', osType = 'ubunt
 module.exports = {
   generateBaseCloudInit,
   generateMachineEnhancements,
+  createCloudInitContext,
   getMachineCloudInit
 };
\ No newline at end of file
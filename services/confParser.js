@@ -0,0 +1,60 @@
+// Parser for the KEY=VALUE configuration files (maas.conf, users.conf)
+const fs = require('fs-extra');
+
+/**
+ * Parse KEY=VALUE lines into an object
+ * Only the first '=' separates key and value, so values may contain '='
+ */
+const parseConf = (content) => {
+  const config = {};
+
+  for (const line of content.split('\n')) {
+    const separator = line.indexOf('=');
+    if (separator === -1) continue;
+
+    const key = line.slice(0, separator).trim();
+    const value = line.slice(separator + 1).trim();
+    if (key && value) {
+      config[key] = value;
+    }
+  }
+
+  return config;
+};
+
+/**
+ * Read and parse a configuration file, returns null if it doesn't exist
+ */
+const readConfFile = (configPath) => {
+  if (!fs.existsSync(configPath)) {
+    return null;
+  }
+  return parseConf(fs.readFileSync(configPath, 'utf8'));
+};
+
+/**
+ * Read and parse a configuration file without blocking the event loop
+ * When previousMtimeMs matches the file's modification time the file is
+ * not re-read and `unchanged` is set; a missing file has an mtime of null
+ */
+const readConfFileAsync = async (configPath, previousMtimeMs) => {
+  let mtimeMs = null;
+  try {
+    ({ mtimeMs } = await fs.stat(configPath));
+  } catch (error) {
+    if (error.code !== 'ENOENT') throw error;
+  }
+
+  if (mtimeMs === previousMtimeMs) {
+    return { unchanged: true, config: null, mtimeMs };
+  }
+
+  const config = mtimeMs === null ? null : parseConf(await fs.readFile(configPath, 'utf8'));
+  return { unchanged: false, config, mtimeMs };
+};
+
+module.exports = {
+  parseConf,
+  readConfFile,
+  readConfFileAsync
+};
@@ -0,0 +1,247 @@
+// Store for provisioning jobs
+// Jobs are served from memory and written to data/provisioning-jobs.json so they survive restarts
+const fs = require('fs-extra');
+const path = require('path');
+const crypto = require('crypto');
+const { EventEmitter } = require('events');
+
+const JOBS_FILE = path.join(__dirname, '..', 'data', 'provisioning-jobs.json');
+
+// Upper bound on retained jobs, the oldest finished jobs are evicted first
+const MAX_JOBS = 500;
+const ACTIVE_JOB_STATUSES = new Set(['pending', 'running']);
+
+// Finished jobs are dropped once they are older than this, checked every hour
+const JOB_RETENTION_MS = (parseFloat(process.env.JOB_RETENTION_HOURS) || 24) * 60 * 60 * 1000;
+const EXPIRY_INTERVAL_MS = 60 * 60 * 1000;
+
+// Changes are written after a short delay so bursts of updates share one write
+const SAVE_DELAY_MS = 1000;
+
+const jobs = new Map();
+// Jobs in creation order, so newest-first listings walk it backwards and stop at the limit
+let jobOrder = [];
+// Number of stored jobs per status, lets filtered listings stop once every match is found
+const statusCounts = new Map();
+let saveTimer = null;
+let saving = Promise.resolve();
+
+// Emits an event named after the job ID whenever that job changes, used for live job updates
+const jobEvents = new EventEmitter();
+jobEvents.setMaxListeners(0);
+
+// Serialized JSON (and its ETag once requested) per job, reused by status polls and
+// event streams until the job changes
+// Jobs must be changed through setJobStatus or followed by publishJob to keep it current
+const jobJsonCache = new WeakMap();
+
+const isActiveJob = (job) => ACTIVE_JOB_STATUSES.has(job.status);
+
+const countStatus = (status, delta) => {
+  statusCounts.set(status, (statusCounts.get(status) || 0) + delta);
+};
+
+const storeJob = (job) => {
+  jobs.set(job.id, job);
+  jobOrder.push(job);
+  countStatus(job.status, 1);
+};
+
+/**
+ * Write all jobs to disk, replacing the file atomically
+ */
+const writeJobs = async () => {
+  try {
+    await fs.ensureDir(path.dirname(JOBS_FILE));
+    const tempFile = `${JOBS_FILE}.tmp`;
+    await fs.writeFile(tempFile, JSON.stringify(Array.from(jobs.values())));
+    await fs.rename(tempFile, JOBS_FILE);
+  } catch (error) {
+    console.error('Error saving provisioning jobs:', error.message);
+  }
+};
+
+/**
+ * Schedule a write of the job store, writes never overlap
+ */
+const persistJobs = () => {
+  if (saveTimer) return;
+  saveTimer = setTimeout(() => {
+    saveTimer = null;
+    saving = saving.then(writeJobs);
+  }, SAVE_DELAY_MS);
+};
+
+/**
+ * Write any pending changes immediately, used on shutdown
+ */
+const flushJobs = () => {
+  if (saveTimer) {
+    clearTimeout(saveTimer);
+    saveTimer = null;
+    saving = saving.then(writeJobs);
+  }
+  return saving;
+};
+
+/**
+ * Load jobs saved by a previous run
+ * Jobs that were still in progress can't be resumed, so they are marked as failed
+ */
+const loadJobs = async () => {
+  try {
+    if (!(await fs.pathExists(JOBS_FILE))) return;
+
+    const savedJobs = JSON.parse(await fs.readFile(JOBS_FILE, 'utf8'));
+    for (const job of savedJobs) {
+      if (isActiveJob(job)) {
+        job.status = 'failed';
+        job.error = 'Server restarted before the job finished';
+        job.updated_at = new Date().toISOString();
+      }
+      storeJob(job);
+    }
+    pruneJobs();
+    console.log(`Loaded ${jobs.size} provisioning jobs`);
+  } catch (error) {
+    console.error('Error loading provisioning jobs:', error.message);
+  }
+};
+
+/**
+ * Drop finished jobs past the retention period, then the oldest finished jobs while over the limit
+ * Returns whether any job was removed
+ */
+const pruneJobs = () => {
+  const expiredBefore = Date.now() - JOB_RETENTION_MS;
+  let excess = jobOrder.length - MAX_JOBS;
+  const storedCount = jobOrder.length;
+
+  jobOrder = jobOrder.filter(storedJob => {
+    if (isActiveJob(storedJob)) return true;
+    const expired = Date.parse(storedJob.completed_at || storedJob.updated_at) < expiredBefore;
+    if (!expired && excess <= 0) return true;
+
+    excess--;
+    jobs.delete(storedJob.id);
+    countStatus(storedJob.status, -1);
+    return false;
+  });
+
+  return jobOrder.length < storedCount;
+};
+
+setInterval(() => {
+  if (pruneJobs()) persistJobs();
+}, EXPIRY_INTERVAL_MS).unref();
+
+/**
+ * Store a new job and evict the oldest finished jobs once over the limit
+ */
+const addJob = (job) => {
+  storeJob(job);
+
+  if (jobOrder.length > MAX_JOBS) {
+    pruneJobs();
+  }
+
+  persistJobs();
+};
+
+/**
+ * Change a job's status, keeping the per-status counts in sync
+ */
+const setJobStatus = (job, status) => {
+  if (jobs.get(job.id) === job) {
+    countStatus(job.status, -1);
+    countStatus(status, 1);
+  }
+  job.status = status;
+  jobJsonCache.delete(job);
+};
+
+/**
+ * Notify live update listeners that a job changed
+ */
+const publishJob = (job) => {
+  jobJsonCache.delete(job);
+  jobEvents.emit(job.id, job);
+};
+
+const getSerializedJob = (job) => {
+  let serialized = jobJsonCache.get(job);
+  if (!serialized) {
+    serialized = { json: JSON.stringify(job), etag: null };
+    jobJsonCache.set(job, serialized);
+  }
+  return serialized;
+};
+
+/**
+ * Get a job serialized as JSON, serializing it only once per change
+ */
+const getJobJson = (job) => getSerializedJob(job).json;
+
+/**
+ * Get a strong ETag for a job's current JSON, hashed only once per change
+ */
+const getJobEtag = (job) => {
+  const serialized = getSerializedJob(job);
+  if (!serialized.etag) {
+    serialized.etag = `"${crypto.createHash('sha1').update(serialized.json).digest('base64url')}"`;
+  }
+  return serialized.etag;
+};
+
+const getJob = (jobId) => jobs.get(jobId);
+
+/**
+ * List jobs newest first, optionally only those with the given status
+ */
+const listJobs = ({ status, limit = Infinity } = {}) => {
+  const matching = status ? (statusCounts.get(status) || 0) : jobOrder.length;
+  const wanted = Math.min(limit, matching);
+  const result = [];
+
+  for (let index = jobOrder.length - 1; index >= 0 && result.length < wanted; index--) {
+    const job = jobOrder[index];
+    if (!status || job.status === status) {
+      result.push(job);
+    }
+  }
+
+  return result;
+};
+
+const countJobs = () => jobs.size;
+
+/**
+ * Lightweight view of a job for listings, without machines, results or config
+ */
+const summarizeJob = (job) => ({
+  id: job.id,
+  status: job.status,
+  created_at: job.created_at,
+  updated_at: job.updated_at,
+  completed_at: job.completed_at,
+  total_machines: job.total_machines,
+  successful_deployments: job.successful_deployments,
+  failed_deployments: job.failed_deployments
+});
+
+module.exports = {
+  jobEvents,
+  isActiveJob,
+  loadJobs,
+  addJob,
+  setJobStatus,
+  publishJob,
+  getJob,
+  getJobJson,
+  getJobEtag,
+  listJobs,
+  countJobs,
+  summarizeJob,
+  persistJobs,
+  flushJobs
+};